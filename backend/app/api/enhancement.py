@@ -49,7 +49,7 @@ async def generate_preview(image_id: str):
         logger.info(f"Generating preview for image {image_id}")
 
         # Generate preview
-        preview_bytes = enhancement_service.create_preview(
+        preview_bytes = await enhancement_service.create_preview_async(
             image_path,
             recommendations,
             max_size=1200
@@ -104,7 +104,7 @@ async def enhance_image(image_id: str):
         logger.info(f"Enhancing full-resolution image {image_id}")
 
         # Generate enhanced image
-        enhanced_bytes = enhancement_service.enhance_image(
+        enhanced_bytes = await enhancement_service.enhance_image_async(
             image_path,
             recommendations
         )
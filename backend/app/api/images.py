@@ -2,6 +2,7 @@ from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from typing import List, Optional
 from pydantic import BaseModel
 import aiofiles
+import asyncio
 import os
 import uuid
 from datetime import datetime
@@ -80,8 +81,9 @@ async def upload_image(file: UploadFile = File(...)):
 
         logger.info(f"Uploaded file to temp: {safe_filename}")
 
-        # Validate image
-        if not ImageProcessor.validate_image(temp_file_path):
+        # Validate image (header reads; kept off the event loop so batch
+        # uploads actually overlap)
+        if not await asyncio.to_thread(ImageProcessor.validate_image, temp_file_path):
             os.remove(temp_file_path)
             raise HTTPException(
                 status_code=400,
@@ -89,7 +91,7 @@ async def upload_image(file: UploadFile = File(...)):
             )
 
         # Extract EXIF data from original before optimization
-        exif_data = ImageProcessor.extract_exif_data(temp_file_path)
+        exif_data = await asyncio.to_thread(ImageProcessor.extract_exif_data, temp_file_path)
 
         # Handle RAW files - convert to JPEG first
         process_path = temp_file_path
@@ -101,21 +103,32 @@ async def upload_image(file: UploadFile = File(...)):
                 f"{image_id}_raw_converted.jpg"
             )
             try:
-                process_path = ImageProcessor.convert_raw_to_jpeg(temp_file_path, jpeg_path)
+                process_path = await ImageProcessor.convert_raw_to_jpeg_async(temp_file_path, jpeg_path)
                 raw_converted_path = jpeg_path
                 logger.info(f"Converted RAW to JPEG: {jpeg_path}")
             except Exception as e:
                 logger.warning(f"Could not convert RAW file, using original: {e}")
 
-        # OPTIMIZATION STEP 1: Optimize image for storage
+        thumbnail_filename = f"thumb_{image_id}.{'webp' if settings.USE_WEBP_THUMBNAILS else 'jpg'}"
+        thumbnail_path = os.path.join(
+            settings.UPLOAD_FOLDER,
+            "thumbnails",
+            thumbnail_filename
+        )
+
+        # OPTIMIZATION: Storage copy + thumbnail from a single decode
         # This resizes to max 3000px and converts to WebP (saves 70-85% space!)
         try:
-            optimized_path, final_width, final_height = ImageProcessor.optimize_image_for_storage(
+            optimized_path, final_width, final_height = await ImageProcessor.optimize_with_thumbnail_async(
                 image_path=process_path,
                 output_path=file_path,  # Will auto-adjust extension for WebP
+                thumbnail_path=thumbnail_path,
                 max_dimension=settings.IMAGE_MAX_DIMENSION,
                 quality=settings.WEBP_QUALITY if settings.USE_WEBP_STORAGE else settings.JPEG_QUALITY,
-                use_webp=settings.USE_WEBP_STORAGE
+                use_webp=settings.USE_WEBP_STORAGE,
+                thumbnail_size=(settings.THUMBNAIL_SIZE, settings.THUMBNAIL_SIZE),
+                thumbnail_quality=settings.THUMBNAIL_QUALITY,
+                thumbnail_webp=settings.USE_WEBP_THUMBNAILS
             )
 
             # Update file_path to the optimized version (may have .webp extension now)
@@ -125,38 +138,51 @@ async def upload_image(file: UploadFile = File(...)):
             logger.info(f"Optimized image stored: {safe_filename} ({final_width}x{final_height})")
         except Exception as e:
             logger.error(f"Optimization failed, using original: {e}")
-            # Fallback: just move temp to final location
-            os.rename(temp_file_path, file_path)
-            final_width = exif_data.get('width', 0)
-            final_height = exif_data.get('height', 0)
-
-        # OPTIMIZATION STEP 2: Create optimized thumbnail
-        thumbnail_filename = f"thumb_{image_id}.jpg"
-        thumbnail_path = os.path.join(
-            settings.UPLOAD_FOLDER,
-            "thumbnails",
-            thumbnail_filename
-        )
-
-        ImageProcessor.create_thumbnail(
-            image_path=file_path,
-            output_path=thumbnail_path,
-            size=(settings.THUMBNAIL_SIZE, settings.THUMBNAIL_SIZE),
-            quality=settings.THUMBNAIL_QUALITY
-        )
+            # Fallback: just move temp to final location and thumbnail it
+            try:
+                os.rename(temp_file_path, file_path)
+                final_width = exif_data.get('width', 0)
+                final_height = exif_data.get('height', 0)
+
+                await ImageProcessor.create_thumbnail_async(
+                    image_path=file_path,
+                    output_path=thumbnail_path,
+                    size=(settings.THUMBNAIL_SIZE, settings.THUMBNAIL_SIZE),
+                    quality=settings.THUMBNAIL_QUALITY,
+                    use_webp=settings.USE_WEBP_THUMBNAILS
+                )
+            except Exception as e:
+                # Passed the signature check but can't be decoded (truncated
+                # or corrupt): don't keep any of its files around
+                logger.error(f"Could not decode uploaded image {file.filename}: {e}")
+                for path in (temp_file_path, file_path, thumbnail_path, raw_converted_path):
+                    if path:
+                        try:
+                            os.unlink(path)
+                        except FileNotFoundError:
+                            pass
+                raise HTTPException(
+                    status_code=400,
+                    detail="Invalid or corrupted image file"
+                )
 
         # CLEANUP: Delete temporary files
         if settings.DELETE_TEMP_FILES:
             try:
                 # Delete temp upload file if it exists
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
+                try:
+                    os.unlink(temp_file_path)
                     logger.info(f"Cleaned up temp file: {temp_file_path}")
+                except FileNotFoundError:
+                    pass
 
                 # Delete RAW converted file if it exists (we keep the original RAW)
-                if raw_converted_path and os.path.exists(raw_converted_path):
-                    os.remove(raw_converted_path)
-                    logger.info(f"Cleaned up RAW conversion: {raw_converted_path}")
+                if raw_converted_path:
+                    try:
+                        os.unlink(raw_converted_path)
+                        logger.info(f"Cleaned up RAW conversion: {raw_converted_path}")
+                    except FileNotFoundError:
+                        pass
             except Exception as e:
                 logger.warning(f"Could not clean up temp files: {e}")
 
@@ -279,19 +305,24 @@ async def upload_batch(files: List[UploadFile] = File(...)):
 
     Returns list of upload responses.
     """
-    responses = []
+    # Process files concurrently; RAW conversion and the optimize/thumbnail
+    # steps run in the shared process pool and the lighter validation/EXIF
+    # reads on threads, so nothing blocks the event loop between uploads
+    semaphore = asyncio.Semaphore(os.cpu_count() or 4)
 
-    for file in files:
-        try:
-            response = await upload_image(file)
-            responses.append(response)
-        except HTTPException as e:
-            logger.error(f"Failed to upload {file.filename}: {e.detail}")
+    async def upload_one(file: UploadFile) -> Optional[ImageUploadResponse]:
+        async with semaphore:
+            try:
+                return await upload_image(file)
+            except HTTPException as e:
+                logger.error(f"Failed to upload {file.filename}: {e.detail}")
+            except Exception as e:
+                logger.error(f"Unexpected error uploading {file.filename}: {e}")
             # Continue with other files
-            continue
-        except Exception as e:
-            logger.error(f"Unexpected error uploading {file.filename}: {e}")
-            continue
+            return None
+
+    results = await asyncio.gather(*(upload_one(file) for file in files))
+    responses = [response for response in results if response is not None]
 
     if not responses:
         raise HTTPException(
@@ -619,16 +650,20 @@ async def delete_image(image_id: str):
             # Delete original image
             if image_data.get('original_url'):
                 file_path = os.path.join(settings.UPLOAD_FOLDER, os.path.basename(image_data['original_url']))
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+                try:
+                    os.unlink(file_path)
                     logger.info(f"Deleted file: {file_path}")
+                except FileNotFoundError:
+                    pass
 
             # Delete thumbnail
             if image_data.get('thumbnail_url'):
                 thumb_path = os.path.join(settings.UPLOAD_FOLDER, os.path.basename(image_data['thumbnail_url']))
-                if os.path.exists(thumb_path):
-                    os.remove(thumb_path)
+                try:
+                    os.unlink(thumb_path)
                     logger.info(f"Deleted thumbnail: {thumb_path}")
+                except FileNotFoundError:
+                    pass
         except Exception as e:
             logger.warning(f"Error deleting files for image {image_id}: {e}")
             # Continue with database deletion even if file deletion fails
@@ -27,10 +27,24 @@ class Settings(BaseSettings):
     OPENAI_MODEL: str = "gpt-5.1"
     OPENAI_MAX_TOKENS: int = 1500
     OPENAI_TEMPERATURE: float = 0.3
+    OPENAI_MAX_CONCURRENCY: int = 8  # Max in-flight analyses in batch_analyze_images
 
     # Google Gemini
     GEMINI_API_KEY: str
     GEMINI_MODEL: str = "gemini-2.0-flash-exp"
+    GEMINI_MAX_CONCURRENCY: int = 8  # Max in-flight analyses in batch_analyze_images
+
+    # Analysis result cache (persists Gemini results across restarts)
+    CACHE_DIR: str = "./cache/analysis"
+    ANALYSIS_CACHE_TTL: int = 30 * 86400  # 30 days
+    ANALYSIS_MEMORY_CACHE_TTL: int = 3600  # In-process copy, 1 hour
+
+    # Local pre-screen: reject hopelessly blurred or clipped images without an API call.
+    # Off by default: the heuristic can't tell night, low-key, snow or backlit
+    # shots from failed exposures, and rejected images never reach the model
+    ENABLE_LOCAL_PRESCREEN: bool = False
+    PRESCREEN_BLUR_THRESHOLD: float = 10.0  # Laplacian variance below this is treated as blurred
+    PRESCREEN_CLIPPED_FRACTION: float = 0.5  # Share of near-black or near-white pixels treated as bad exposure
 
     # Supabase
     SUPABASE_URL: str
@@ -58,10 +72,15 @@ class Settings(BaseSettings):
     USE_WEBP_STORAGE: bool = True  # Convert to WebP for 25-35% smaller files
     JPEG_QUALITY: int = 90  # Quality for JPEG storage (90 = excellent, 85 = very good)
     WEBP_QUALITY: int = 88  # Quality for WebP storage (88 ≈ JPEG 90)
+    USE_LIBVIPS: bool = False  # Resize/encode storage copies with pyvips (optional dependency) instead of Pillow
 
     # Thumbnails
     THUMBNAIL_SIZE: int = 400  # Thumbnail max dimension (pixels)
-    THUMBNAIL_QUALITY: int = 75  # Lower quality OK for thumbnails (saves bandwidth)
+    THUMBNAIL_QUALITY: int = 82  # Lower quality OK for thumbnails (82 is the usual size/quality knee)
+    USE_WEBP_THUMBNAILS: bool = True  # WebP q82 ≈ JPEG q90 at ~25% fewer bytes
+
+    # Enhancement
+    ENHANCEMENT_DECODE_CACHE_SIZE: int = 4  # Decoded previews (~4MB each at 1200px) kept in the server process
 
     # Cleanup
     DELETE_TEMP_FILES: bool = True  # Clean up RAW converted files and temp files
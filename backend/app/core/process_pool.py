@@ -0,0 +1,26 @@
+"""
+Process pool shared by the CPU-bound image work (ingest and enhancement)
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import os
+import sys
+
+# Created on first use. Worker processes sidestep the GIL and keep the event
+# loop free; one pool for the whole server keeps the worker count at
+# cpu_count instead of one cpu_count-sized pool per service. Workers are
+# recycled every _MAX_TASKS_PER_CHILD tasks (Python 3.11+) because Pillow
+# doesn't always hand native buffers back to the OS
+_POOL: Optional[ProcessPoolExecutor] = None
+_MAX_TASKS_PER_CHILD = 32
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the process-wide pool for CPU-bound image work."""
+    global _POOL
+    if _POOL is None:
+        if sys.version_info >= (3, 11):
+            _POOL = ProcessPoolExecutor(max_workers=os.cpu_count(), max_tasks_per_child=_MAX_TASKS_PER_CHILD)
+        else:
+            _POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _POOL
@@ -35,6 +35,19 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def log_image_codecs():
+    # JPEG decode/encode is several times faster when Pillow is linked against
+    # libjpeg-turbo (official wheels are; source builds such as Pillow-SIMD
+    # depend on the system library they were compiled against)
+    from PIL import __version__ as pil_version, features
+
+    if features.check_feature("libjpeg_turbo"):
+        logger.info(f"Pillow {pil_version} using libjpeg-turbo {features.version_feature('libjpeg_turbo')}")
+    else:
+        logger.warning(f"Pillow {pil_version} is not linked against libjpeg-turbo; JPEG encode/decode will be slower")
+
+
 # Custom exception handler for validation errors
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -1,53 +1,483 @@
+import io
+import os
+import base64
 import json
-from typing import Dict, Any, Optional
+import re
+import orjson
+from typing import TYPE_CHECKING, Dict, Any, Optional
 from datetime import datetime
-import google.generativeai as genai
-from PIL import Image
+from blake3 import blake3
+from cachetools import TTLCache
+import diskcache
+import httpx
 from app.core.config import settings
-from app.models.image import (
-    ImageAnalysisResult,
-    ImageFactorScores,
-    SubjectAnalysis,
-    QualityTier,
-    CameraSettingsRecommendations,
-    PostProcessingRecommendations
-)
+from app.models.image import ImageAnalysisResult, ImageFactorScores, QualityTier, SubjectAnalysis
 import logging
+from functools import lru_cache
 import asyncio
-from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted
+import threading
+
+# google.generativeai (protobuf/grpc), PIL and numpy are imported on first use
+# so that workers which never run an analysis don't pay for them at boot
+if TYPE_CHECKING:
+    import google.generativeai as genai
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the prompt or response parsing changes in a way that should
+# invalidate previously cached analysis results
+PROMPT_VERSION = 2
+
+_HASH_CHUNK_SIZE = 1 << 20  # 1 MB
 
-def serialize_exif(data: Any) -> Any:
+
+def _hash_file(path: str) -> str:
     """
-    Recursively convert datetime objects to strings for JSON serialization.
+    BLAKE3 hex digest of a file's contents.
+
+    Reads in 1 MB chunks so memory stays bounded for large RAW files, and lets
+    BLAKE3 spread each chunk across SIMD lanes and worker threads.
     """
-    if isinstance(data, datetime):
-        return data.isoformat()
-    elif isinstance(data, dict):
-        return {k: serialize_exif(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [serialize_exif(item) for item in data]
-    else:
-        return data
+    hasher = blake3(max_threads=blake3.AUTO)
+    with open(path, "rb", buffering=_HASH_CHUNK_SIZE) as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
 
 
-class GeminiVisionService:
-    def __init__(self):
+@lru_cache(maxsize=4096)
+def _hash_file_version(path: str, mtime_ns: int, size: int) -> str:
+    return _hash_file(path)
+
+
+def _file_digest(path: str) -> str:
+    """
+    Content digest of a file, memoized per (path, mtime, size).
+
+    Re-analyses and batch dedupe skip rereading unchanged files; any
+    modification changes the stat key and forces a fresh hash.
+    """
+    st = os.stat(path)
+    return _hash_file_version(path, st.st_mtime_ns, st.st_size)
+
+
+def _fit_within(width: int, height: int, max_dimension: int) -> tuple[int, int]:
+    # Scale so the longest side is max_dimension, maintaining aspect ratio
+    if width > height:
+        return max_dimension, int((max_dimension / width) * height)
+    return int((max_dimension / height) * width), max_dimension
+
+
+def _decode_and_prepare(image_path: str, max_dimension: int = 2048) -> bytes:
+    """
+    Load an image, downscale it for analysis and encode it to JPEG bytes.
+
+    Blocking CPU work; run it via asyncio.to_thread from async code.
+    """
+    from PIL import Image
+
+    # The context manager releases the file handle and decoded pixel buffer
+    # as soon as the bytes are encoded, rather than when the image is collected
+    with Image.open(image_path) as img:
+        # OPTIMIZATION 1: Resize large images to max 2048px (preserves quality, 5-10x faster)
+        if img.width > max_dimension or img.height > max_dimension:
+            logger.info(f"Resizing image from {img.width}x{img.height} to fit {max_dimension}px")
+            # Let libjpeg downscale in the DCT domain while decoding (no-op for
+            # non-JPEGs). Draft to the aspect-fitted size: a square box caps the
+            # scale by the short side, and once drafted thumbnail() can't redo it
+            img.draft("RGB", _fit_within(img.width, img.height, max_dimension))
+            # reducing_gap: cheap integer-factor box reduction first, then LANCZOS
+            # over the remaining (much smaller) gap
+            img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            logger.info(f"Resized to {img.width}x{img.height}")
+
+        # Encode once so the SDK doesn't re-serialize the image on every (re)try
+        buf = io.BytesIO()
+        if img.mode != "RGB":
+            with img.convert("RGB") as rgb:
+                rgb.save(buf, format="JPEG", quality=85, optimize=False)
+        else:
+            img.save(buf, format="JPEG", quality=85, optimize=False)
+    return buf.getvalue()
+
+
+@lru_cache(maxsize=16)
+def _load_resized_logo(logo_path: str, mtime_ns: int, max_logo_size: int = 512) -> bytes:
+    """
+    Load a team logo, resized to a reasonable size (max 512px), as PNG bytes.
+
+    Memoized per (path, mtime): the same logo is sent with every image of a
+    team session, so it is decoded, resized and encoded once. PNG keeps any
+    transparency.
+    """
+    from PIL import Image
+
+    with Image.open(logo_path) as logo_img:
+        if logo_img.width > max_logo_size or logo_img.height > max_logo_size:
+            logo_img.draft("RGB", _fit_within(logo_img.width, logo_img.height, max_logo_size))
+            logo_img.thumbnail((max_logo_size, max_logo_size), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        if logo_img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+            with logo_img.convert("RGBA") as converted:
+                converted.save(buf, format="PNG")
+        else:
+            logo_img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _load_logo(logo_path: str) -> Dict[str, Any]:
+    """
+    Return the team logo as an inline image part.
+
+    Blocking; run it via asyncio.to_thread from async code.
+    """
+    data = _load_resized_logo(logo_path, os.stat(logo_path).st_mtime_ns)
+    return {"mime_type": "image/png", "data": data}
+
+
+_PRESCREEN_SIZE = 512
+
+
+def _prescreen(image_path: str) -> Optional[str]:
+    """
+    Cheap local check for images that are unusable regardless of content.
+
+    Returns a rejection reason for severe blur or extreme exposure, None
+    otherwise. Works on a small grayscale decode, so it costs a few ms.
+    Blocking CPU work; run it via asyncio.to_thread from async code.
+    """
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        img.draft("L", (_PRESCREEN_SIZE, _PRESCREEN_SIZE))
+        img.thumbnail((_PRESCREEN_SIZE, _PRESCREEN_SIZE), Image.Resampling.BILINEAR)
+        with img.convert("L") as gray_img:
+            gray = np.asarray(gray_img, dtype=np.float32)
+
+    # Variance of the 4-neighbour Laplacian: low means few edges, i.e. blur
+    laplacian = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4 * gray[1:-1, 1:-1]
+    )
+    sharpness = float(laplacian.var())
+    if sharpness < settings.PRESCREEN_BLUR_THRESHOLD:
+        return f"Severe blur detected (Laplacian variance {sharpness:.1f})"
+
+    dark = float(np.count_nonzero(gray <= 12)) / gray.size
+    bright = float(np.count_nonzero(gray >= 243)) / gray.size
+    if dark > settings.PRESCREEN_CLIPPED_FRACTION:
+        return f"Extreme underexposure ({dark:.0%} of pixels near black)"
+    if bright > settings.PRESCREEN_CLIPPED_FRACTION:
+        return f"Extreme overexposure ({bright:.0%} of pixels near white)"
+    return None
+
+
+def _prescreen_reject(reason: str) -> ImageAnalysisResult:
+    """Build the result returned for images rejected by the local pre-screen."""
+    return ImageAnalysisResult(
+        overall_score=0,
+        quality_tier=QualityTier.REJECT,
+        factor_scores=ImageFactorScores(**dict.fromkeys(ImageFactorScores.model_fields, 0)),
+        detected_issues=[reason],
+        critical_defects=[reason],
+        is_reject=True,
+        ai_summary=f"Rejected by local pre-screen before AI analysis: {reason}.",
+        subject_analysis=SubjectAnalysis()
+    )
+
+
+def _non_empty_block(block: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Return block if any of its values is set, else None."""
+    return block if block and any(block.values()) else None
+
+
+def _json_default(obj: Any) -> Any:
+    """Fallback for values orjson can't serialize natively (e.g. EXIF rationals)."""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _dumps(data: Any) -> str:
+    """Serialize EXIF/sequence data for the prompt in a single C-level pass."""
+    return orjson.dumps(data, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+# Shared across service instances and retries; the model owns the underlying
+# client channel, so reusing it avoids rebuilding connections per instance
+_MODEL: Optional["genai.GenerativeModel"] = None
+
+
+def _get_model() -> "genai.GenerativeModel":
+    """Return the process-wide Gemini model, importing and configuring the SDK on first use."""
+    global _MODEL
+    if _MODEL is None:
+        import google.generativeai as genai
+
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+        _MODEL = genai.GenerativeModel(settings.GEMINI_MODEL)
+    return _MODEL
+
+
+def _nullable(type_: str, description: Optional[str] = None) -> Dict[str, Any]:
+    schema: Dict[str, Any] = {"type": type_, "nullable": True}
+    if description:
+        schema["description"] = description
+    return schema
+
+
+# Direct value -> member lookup; handing pydantic an enum instance lets it skip
+# its own string-to-enum conversion
+_TIER_MAP: Dict[str, QualityTier] = {tier.value: tier for tier in QualityTier}
+
+_STRING_LIST_SCHEMA = {"type": "ARRAY", "items": {"type": "STRING"}}
+
+# Response shape enforced server-side via structured output, so the JSON
+# template no longer has to be spelled out in every prompt
+_RESPONSE_SCHEMA: Dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "overall_score": {"type": "NUMBER", "description": "0-100"},
+        "quality_tier": {"type": "STRING", "format": "enum", "enum": list(_TIER_MAP)},
+        "factor_scores": {
+            "type": "OBJECT",
+            "properties": {name: {"type": "NUMBER", "description": "0-100"} for name in ImageFactorScores.model_fields},
+            "required": list(ImageFactorScores.model_fields)
+        },
+        "detected_issues": _STRING_LIST_SCHEMA,
+        "critical_defects": _STRING_LIST_SCHEMA,
+        "is_reject": {"type": "BOOLEAN"},
+        "ai_summary": {"type": "STRING", "description": "Brief 2-3 sentence summary of image quality and characteristics"},
+        "recommendations": _STRING_LIST_SCHEMA,
+        "subject_analysis": {
+            "type": "OBJECT",
+            "properties": {
+                "faces_detected": {"type": "INTEGER"},
+                "eyes_status": {"type": "STRING", "format": "enum", "enum": ["all_open", "some_closed", "blink_detected", "no_faces"]},
+                "primary_subject": {"type": "STRING"},
+                "has_people": {"type": "BOOLEAN"}
+            },
+            "required": ["faces_detected", "eyes_status", "primary_subject", "has_people"]
+        },
+        "camera_settings": {
+            "type": "OBJECT",
+            "properties": {
+                "iso_recommendation": _nullable("STRING"),
+                "aperture_recommendation": _nullable("STRING"),
+                "shutter_speed_recommendation": _nullable("STRING"),
+                "exposure_compensation": _nullable("STRING", "EV adjustment advice"),
+                "white_balance": _nullable("STRING"),
+                "focus_mode": _nullable("STRING"),
+                "metering_mode": _nullable("STRING"),
+                "general_tips": _STRING_LIST_SCHEMA
+            }
+        },
+        "post_processing": {
+            "type": "OBJECT",
+            "properties": {
+                "exposure_adjustment": _nullable("NUMBER", "-2.0 to +2.0 EV"),
+                "contrast_adjustment": _nullable("NUMBER", "-100 to +100"),
+                "highlights_adjustment": _nullable("NUMBER", "-100 to +100"),
+                "shadows_adjustment": _nullable("NUMBER", "-100 to +100"),
+                "whites_adjustment": _nullable("NUMBER", "-100 to +100"),
+                "blacks_adjustment": _nullable("NUMBER", "-100 to +100"),
+                "saturation_adjustment": _nullable("NUMBER", "-100 to +100"),
+                "vibrance_adjustment": _nullable("NUMBER", "-100 to +100"),
+                "sharpness_adjustment": _nullable("NUMBER", "0 to +100"),
+                "noise_reduction": _nullable("NUMBER", "0 to 100"),
+                "temperature_adjustment": _nullable("INTEGER", "-100 to +100"),
+                "tint_adjustment": _nullable("INTEGER", "-100 to +100"),
+                "can_auto_fix": {"type": "BOOLEAN", "description": "true if adjustments would help significantly"}
+            },
+            "required": ["can_auto_fix"]
+        }
+    },
+    "required": [
+        "overall_score", "quality_tier", "factor_scores", "detected_issues", "critical_defects",
+        "is_reject", "ai_summary", "recommendations", "subject_analysis", "camera_settings", "post_processing"
+    ]
+}
 
-    def _create_analysis_prompt(
-        self,
-        exif_data: Optional[Dict] = None,
-        sequence_info: Optional[Dict] = None,
-        team_mode: bool = False,
-        player_roster: Optional[list[Dict]] = None,
-        team_colors: Optional[Dict] = None
-    ) -> str:
-        """Create comprehensive analysis prompt for Gemini Vision API."""
-        prompt = """
+# Team mode additionally asks for jersey detection fields
+_TEAM_RESPONSE_SCHEMA: Dict[str, Any] = {
+    **_RESPONSE_SCHEMA,
+    "properties": {
+        **_RESPONSE_SCHEMA["properties"],
+        "jersey_detection": {
+            "type": "OBJECT",
+            "properties": {
+                "is_group_photo": {"type": "BOOLEAN"},
+                "detected_jersey_numbers": {
+                    "type": "ARRAY",
+                    "items": {
+                        "type": "OBJECT",
+                        "properties": {
+                            "number": {"type": "STRING"},
+                            "confidence": {"type": "NUMBER", "description": "0.0-1.0"},
+                            "player_name": _nullable("STRING", "Roster match")
+                        },
+                        "required": ["number", "confidence"]
+                    }
+                },
+                "primary_jersey_number": _nullable("STRING"),
+                "jersey_confidence": _nullable("NUMBER", "0.0-1.0"),
+                "player_names": _STRING_LIST_SCHEMA,
+                "team_logo_match": _nullable("BOOLEAN")
+            },
+            "required": ["is_group_photo", "detected_jersey_numbers", "player_names"]
+        }
+    },
+    "required": _RESPONSE_SCHEMA["required"] + ["jersey_detection"]
+}
+
+
+def _schema_id(schema: Dict[str, Any]) -> str:
+    return blake3(orjson.dumps(schema, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+
+
+# Part of the result cache key: team and standard requests never share an
+# entry, and any schema change invalidates old results
+_RESPONSE_SCHEMA_ID = _schema_id(_RESPONSE_SCHEMA)
+_TEAM_RESPONSE_SCHEMA_ID = _schema_id(_TEAM_RESPONSE_SCHEMA)
+
+
+# Captures the JSON object inside an optional ```json / ``` markdown fence
+_FENCE = re.compile(r"^\s*(?:```(?:json)?\s*)?(\{.*\})\s*(?:```)?\s*$", re.S)
+
+
+async def _read_json_stream(response: Any) -> tuple[Optional[str], Any]:
+    """
+    Consume a streamed response, noting when its top-level JSON object closes.
+
+    Returns the text up to and including the closing brace (None if the
+    stream ended before the object was complete) and the last chunk received.
+    The stream is always read to the end and closed: the final chunk carries
+    usage_metadata and finish_reason, and stopping early would leak the
+    underlying HTTP response.
+    """
+    parts: list[str] = []
+    complete: Optional[str] = None
+    depth = 0
+    in_string = False
+    escaped = False
+    last_chunk = None
+    chunks = response.__aiter__()
+    try:
+        async for chunk in chunks:
+            last_chunk = chunk
+            if complete is not None:
+                continue  # Drain; only the trailing metadata is still needed
+            try:
+                text = chunk.text
+            except (ValueError, AttributeError):
+                continue  # e.g. a final chunk carrying only finish_reason
+            for i, ch in enumerate(text):
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif ch == "\\":
+                        escaped = True
+                    elif ch == '"':
+                        in_string = False
+                elif ch == '"':
+                    in_string = True
+                elif ch == "{":
+                    depth += 1
+                elif ch == "}":
+                    depth -= 1
+                    if depth == 0:
+                        # Drop anything after the object (e.g. a closing fence)
+                        parts.append(text[:i + 1])
+                        complete = "".join(parts)
+                        break
+            else:
+                parts.append(text)
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    return complete, last_chunk
+
+
+def _close_truncated_json(text: str, top_level_only: bool = False) -> Optional[str]:
+    """
+    Turn a truncated JSON document into a parseable one.
+
+    Cuts back to the last comma outside a string, dropping the incomplete
+    trailing member, and appends the closers for every bracket still open at
+    that point. With top_level_only, only commas between members of the
+    outermost object count, so every member kept is complete. Returns None if
+    there is no such cut point.
+    """
+    stack: list[str] = []
+    last_cut: Optional[tuple[int, str]] = None
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            stack.append("}")
+        elif ch == "[":
+            stack.append("]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return text[:i + 1]
+        elif ch == "," and stack and (len(stack) == 1 or not top_level_only):
+            last_cut = (i, "".join(reversed(stack)))
+    if last_cut is None:
+        return None
+    cut, closers = last_cut
+    return text[:cut] + closers
+
+
+# First-attempt output budget: a standard analysis fits well within 2048 tokens;
+# team mode adds per-player room for jersey detections, up to 6144
+_BASE_MAX_TOKENS = 2048
+_TOKENS_PER_ROSTER_PLAYER = 40
+_PRIMARY_MAX_TOKENS = 6144
+_RETRY_MAX_TOKENS = 8192  # Ceiling for the truncation retry
+_RETRY_MIN_HEADROOM = 1024  # A retry must allow at least this much more than the first attempt
+_OUTPUT_TOKENS_EMA_ALPHA = 0.2
+
+
+def _generation_config_fields(max_output_tokens: int, team_mode: bool) -> Dict[str, Any]:
+    return {
+        "temperature": 0.3,
+        "max_output_tokens": max_output_tokens,
+        "response_mime_type": "application/json",
+        "response_schema": _TEAM_RESPONSE_SCHEMA if team_mode else _RESPONSE_SCHEMA
+    }
+
+
+def _primary_token_budget(team_mode: bool, roster_size: int = 0) -> int:
+    if not team_mode:
+        return _BASE_MAX_TOKENS
+    return min(_PRIMARY_MAX_TOKENS, _BASE_MAX_TOKENS + _TOKENS_PER_ROSTER_PLAYER * roster_size)
+
+
+# Gemini Batch API (REST): jobs run server-side at reduced cost, for
+# non-interactive workloads such as culling a whole shoot overnight
+_BATCH_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+_BATCH_INLINE_LIMIT = 18 * 1024 * 1024  # Inline batch requests are capped at 20MB per job
+_BATCH_DONE_STATES = frozenset({
+    "BATCH_STATE_SUCCEEDED", "BATCH_STATE_FAILED", "BATCH_STATE_CANCELLED", "BATCH_STATE_EXPIRED"
+})
+
+
+# Static prompt pieces shared by every analysis request; only the team,
+# EXIF and sequence sections vary per image.
+_BASE_PROMPT = """
 Analyze this photograph as a professional photography expert. Evaluate the image across these specific criteria and provide scores (0-100) for each:
 
 TECHNICAL QUALITY (12 factors):
@@ -103,41 +533,16 @@ POST-PROCESSING RECOMMENDATIONS:
 - Set can_auto_fix=true only if automated adjustments would significantly improve the image
 - All adjustment values should be realistic and applicable in standard photo editing software"""
 
-        # Add team/jersey detection section if team mode is enabled
-        if team_mode and player_roster:
-            # Build team color context string
-            color_context = ""
-            if team_colors:
-                home_colors = []
-                away_colors = []
-
-                if team_colors.get("home", {}).get("primary"):
-                    home_colors.append(f"Primary: {team_colors['home']['primary']}")
-                if team_colors.get("home", {}).get("secondary"):
-                    home_colors.append(f"Secondary: {team_colors['home']['secondary']}")
-                if team_colors.get("home", {}).get("tertiary"):
-                    home_colors.append(f"Tertiary: {team_colors['home']['tertiary']}")
-
-                if team_colors.get("away", {}).get("primary"):
-                    away_colors.append(f"Primary: {team_colors['away']['primary']}")
-                if team_colors.get("away", {}).get("secondary"):
-                    away_colors.append(f"Secondary: {team_colors['away']['secondary']}")
-                if team_colors.get("away", {}).get("tertiary"):
-                    away_colors.append(f"Tertiary: {team_colors['away']['tertiary']}")
-
-                if home_colors:
-                    color_context += f"\nHome Jersey Colors: {', '.join(home_colors)}"
-                if away_colors:
-                    color_context += f"\nAway Jersey Colors: {', '.join(away_colors)}"
-
-            prompt += f"""
+# Team mode section: only the roster and colors vary between calls
+_TEAM_HEADER = """
 
 TEAM MODE - PLAYER AND JERSEY DETECTION:
 This image is being analyzed in TEAM MODE for player identification.
 
 Player Roster:
-{json.dumps(player_roster, indent=2)}
-{color_context}
+"""
+
+_TEAM_INSTRUCTIONS = """
 
 CRITICAL PLAYER DETECTION INSTRUCTIONS:
 - FOCUS ON IDENTIFYING ALL PLAYERS IN THE TEAM'S COLORS (as specified above)
@@ -165,106 +570,290 @@ Include in your response:
 - team_logo_match: true/false if team logo appears to match (or null if logo not visible)
 """
 
-        prompt += """
-
-Provide response in this EXACT JSON format:
-{
-  "overall_score": <0-100>,
-  "quality_tier": "excellent|good|acceptable|poor|reject",
-  "factor_scores": {
-    "sharpness": <0-100>,
-    "exposure": <0-100>,
-    "color_accuracy": <0-100>,
-    "noise_grain": <0-100>,
-    "dynamic_range": <0-100>,
-    "rule_of_thirds": <0-100>,
-    "subject_placement": <0-100>,
-    "framing": <0-100>,
-    "leading_lines": <0-100>,
-    "balance": <0-100>,
-    "depth": <0-100>,
-    "negative_space": <0-100>,
-    "perspective": <0-100>,
-    "facial_detection": <0-100>,
-    "eye_status": <0-100>,
-    "facial_expression": <0-100>,
-    "body_language": <0-100>,
-    "subject_attention": <0-100>,
-    "group_dynamics": <0-100>,
-    "motion_blur": <0-100>,
-    "subject_lighting": <0-100>,
-    "skin_tones": <0-100>,
-    "subject_framing": <0-100>,
-    "lighting_quality": <0-100>,
-    "color_harmony": <0-100>,
-    "emotional_impact": <0-100>,
-    "uniqueness": <0-100>,
-    "professional_polish": <0-100>
-  },
-  "detected_issues": ["issue1", "issue2"],
-  "critical_defects": [],
-  "is_reject": false,
-  "ai_summary": "Brief 2-3 sentence summary of image quality and characteristics",
-  "recommendations": ["recommendation1", "recommendation2"],
-  "subject_analysis": {
-    "faces_detected": 0,
-    "eyes_status": "all_open|some_closed|blink_detected|no_faces",
-    "primary_subject": "description",
-    "has_people": false
-  },
-  "camera_settings": {
-    "iso_recommendation": "Specific ISO advice or null",
-    "aperture_recommendation": "Specific aperture advice or null",
-    "shutter_speed_recommendation": "Specific shutter speed advice or null",
-    "exposure_compensation": "Specific EV adjustment advice or null",
-    "white_balance": "Specific WB advice or null",
-    "focus_mode": "Specific focus mode advice or null",
-    "metering_mode": "Specific metering advice or null",
-    "general_tips": ["tip1", "tip2"]
-  },
-  "post_processing": {
-    "exposure_adjustment": <-2.0 to +2.0 or null>,
-    "contrast_adjustment": <-100 to +100 or null>,
-    "highlights_adjustment": <-100 to +100 or null>,
-    "shadows_adjustment": <-100 to +100 or null>,
-    "whites_adjustment": <-100 to +100 or null>,
-    "blacks_adjustment": <-100 to +100 or null>,
-    "saturation_adjustment": <-100 to +100 or null>,
-    "vibrance_adjustment": <-100 to +100 or null>,
-    "sharpness_adjustment": <0 to +100 or null>,
-    "noise_reduction": <0 to 100 or null>,
-    "temperature_adjustment": <-100 to +100 or null>,
-    "tint_adjustment": <-100 to +100 or null>,
-    "can_auto_fix": <true if adjustments would help significantly, false otherwise>
-  }"""
-
-        # Add jersey detection fields to JSON format if team mode
-        if team_mode:
-            prompt += """,
-  "jersey_detection": {
-    "is_group_photo": false,
-    "detected_jersey_numbers": [{"number": "23", "confidence": 0.95, "player_name": "John Smith"}],
-    "primary_jersey_number": "23",
-    "jersey_confidence": 0.95,
-    "player_names": ["John Smith"],
-    "team_logo_match": true
-  }"""
-
-        prompt += """
-}
-"""
+# EXIF tags relevant to the camera-settings feedback. Everything else (MakerNote
+# blobs, thumbnails, vendor tags) only inflates the prompt. A tuple rather than
+# a set keeps the serialized prompt, and therefore the cache key, stable.
+_EXIF_WHITELIST = (
+    "Make", "Model", "LensModel", "FocalLength", "FNumber", "ExposureTime",
+    "ISOSpeedRatings", "ISO", "ExposureProgram", "ExposureCompensation",
+    "ExposureBiasValue", "MeteringMode", "WhiteBalance", "Flash",
+    "DateTimeOriginal", "DateTime"
+)
+
+_TRAILER = "\n\nBe critical but fair. Apply professional photography standards. Closed eyes or blinks should result in rejection (is_reject: true, eye_status score: 0). Return ONLY valid JSON."
+
+
+@lru_cache(maxsize=64)
+def _build_team_section(roster_key: tuple, colors_key: tuple) -> str:
+    """
+    Build the team-mode prompt section.
+
+    Memoized on hashable snapshots of the roster and team colors (see
+    _team_section_keys), which stay the same across a whole team session.
+    """
+    player_roster = [dict(player) for player in roster_key]
+    team_colors = {side: dict(colors) for side, colors in colors_key}
+
+    # Build team color context string
+    color_context = ""
+    if team_colors:
+        home_colors = []
+        away_colors = []
+
+        if team_colors.get("home", {}).get("primary"):
+            home_colors.append(f"Primary: {team_colors['home']['primary']}")
+        if team_colors.get("home", {}).get("secondary"):
+            home_colors.append(f"Secondary: {team_colors['home']['secondary']}")
+        if team_colors.get("home", {}).get("tertiary"):
+            home_colors.append(f"Tertiary: {team_colors['home']['tertiary']}")
+
+        if team_colors.get("away", {}).get("primary"):
+            away_colors.append(f"Primary: {team_colors['away']['primary']}")
+        if team_colors.get("away", {}).get("secondary"):
+            away_colors.append(f"Secondary: {team_colors['away']['secondary']}")
+        if team_colors.get("away", {}).get("tertiary"):
+            away_colors.append(f"Tertiary: {team_colors['away']['tertiary']}")
+
+        if home_colors:
+            color_context += f"\nHome Jersey Colors: {', '.join(home_colors)}"
+        if away_colors:
+            color_context += f"\nAway Jersey Colors: {', '.join(away_colors)}"
+
+    return "".join((
+        _TEAM_HEADER,
+        _dumps(player_roster),
+        color_context,
+        _TEAM_INSTRUCTIONS
+    ))
+
+
+@lru_cache(maxsize=8)
+def _prompt_prefix(roster_key: tuple, colors_key: tuple) -> str:
+    """Base prompt joined with the team-mode section for one roster and color set."""
+    return _BASE_PROMPT + _build_team_section(roster_key, colors_key)
+
+
+def _team_section_keys(player_roster: list[Dict], team_colors: Optional[Dict]) -> tuple[tuple, tuple]:
+    """Convert roster and colors into hashable cache keys, preserving key order."""
+    roster_key = tuple(tuple(player.items()) for player in player_roster)
+    colors_key = tuple(
+        (side, tuple(colors.items()))
+        for side, colors in (team_colors or {}).items()
+        if isinstance(colors, dict)
+    )
+    return roster_key, colors_key
 
+
+class GeminiVisionService:
+    def __init__(self):
+        # Content-addressed caches of parsed results: re-analyzing the same file
+        # with the same prompt and model never needs another API round-trip.
+        # The in-process TTL cache fronts a disk cache that survives restarts.
+        self._result_cache: TTLCache = TTLCache(maxsize=1024, ttl=settings.ANALYSIS_MEMORY_CACHE_TTL)
+        # Opened on first use (on a worker thread): the service is constructed
+        # at import time, which must not touch SQLite or the filesystem
+        self._disk_cache: Optional[diskcache.Cache] = None
+        self._disk_cache_lock = threading.Lock()
+        # Running average of output tokens on successful calls, used to size the
+        # MAX_TOKENS retry instead of always jumping to the ceiling
+        self._ema_out_tokens: Optional[float] = None
+
+    @property
+    def model(self) -> "genai.GenerativeModel":
+        # Resolved on first use so constructing the service doesn't import the SDK
+        return _get_model()
+
+    def _retry_token_budget(self, primary_tokens: int) -> int:
+        """Output token budget for a retry after a MAX_TOKENS truncation."""
+        budget = primary_tokens + _RETRY_MIN_HEADROOM
+        if self._ema_out_tokens is not None:
+            budget = max(budget, int(self._ema_out_tokens * 1.5))
+        return min(_RETRY_MAX_TOKENS, budget)
+
+    def _record_output_tokens(self, response: Any) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        out_tokens = getattr(usage, "candidates_token_count", None)
+        if not out_tokens:
+            return
+        if self._ema_out_tokens is None:
+            self._ema_out_tokens = float(out_tokens)
+        else:
+            self._ema_out_tokens += _OUTPUT_TOKENS_EMA_ALPHA * (out_tokens - self._ema_out_tokens)
+
+    def _create_analysis_prompt(
+        self,
+        exif_data: Optional[Dict] = None,
+        sequence_info: Optional[Dict] = None,
+        team_mode: bool = False,
+        player_roster: Optional[list[Dict]] = None,
+        team_colors: Optional[Dict] = None
+    ) -> str:
+        """Create comprehensive analysis prompt for Gemini Vision API."""
+        # Base prompt plus team/jersey detection section if team mode is enabled;
+        # identical for every image of a session, so it is built once
+        if team_mode and player_roster:
+            parts = [_prompt_prefix(*_team_section_keys(player_roster, team_colors))]
+        else:
+            parts = [_BASE_PROMPT]
+
+        # Compact JSON: indentation only adds prompt tokens the model doesn't need
         if exif_data:
-            serializable_exif = serialize_exif(exif_data)
-            prompt += f"\n\nImage EXIF Data:\n{json.dumps(serializable_exif, indent=2)}"
+            trimmed_exif = {
+                tag: exif_data[tag] for tag in _EXIF_WHITELIST
+                if exif_data.get(tag) is not None
+            }
+            if trimmed_exif:
+                parts.append(f"\n\nImage EXIF Data:\n{_dumps(trimmed_exif)}")
 
         if sequence_info:
-            serializable_sequence = serialize_exif(sequence_info)
-            prompt += f"\n\nSequence Context:\n{json.dumps(serializable_sequence, indent=2)}"
+            parts.append(f"\n\nSequence Context:\n{_dumps(sequence_info)}")
+
+        parts.append(_TRAILER)
 
-        prompt += "\n\nBe critical but fair. Apply professional photography standards. Closed eyes or blinks should result in rejection (is_reject: true, eye_status score: 0). Return ONLY valid JSON."
+        return "".join(parts)
 
-        return prompt
+    def _salvage_truncated(self, response: Any, team_mode: bool = False) -> Optional[ImageAnalysisResult]:
+        """Parse a MAX_TOKENS-truncated response, or None if it lacks required fields."""
+        try:
+            # jersey_detection is the last key of the team schema, so it is the
+            # member most likely to be cut off; _parse_analysis would quietly
+            # default it, so team mode only accepts it complete
+            closed = _close_truncated_json(response.text, top_level_only=team_mode)
+            if closed is None:
+                return None
+            if team_mode and "jersey_detection" not in orjson.loads(closed):
+                logger.info("Truncated response lost jersey_detection, not salvageable")
+                return None
+            return self._parse_analysis(closed)
+        except Exception as e:
+            logger.info(f"Truncated response not salvageable: {e}")
+            return None
+
+    async def _cache_key(
+        self,
+        image_path: str,
+        prompt: str,
+        team_mode: bool = False,
+        team_logo_path: Optional[str] = None
+    ) -> str:
+        """
+        Build the result cache key for one request.
+
+        Results are keyed by the original file's contents plus everything that
+        shapes the request (prompt, response schema, logo contents), so a hit
+        skips decoding as well as the API call.
+        """
+        file_hash = await asyncio.to_thread(_file_digest, image_path)
+        request_hasher = blake3(prompt.encode())
+        if team_logo_path:
+            # Logo contents, not its path: a replaced logo must not serve stale results
+            try:
+                request_hasher.update((await asyncio.to_thread(_file_digest, team_logo_path)).encode())
+            except OSError:
+                pass  # Missing logo; the request is sent without it
+        schema_id = _TEAM_RESPONSE_SCHEMA_ID if team_mode else _RESPONSE_SCHEMA_ID
+        return (
+            f"{file_hash}:{settings.GEMINI_MODEL}:"
+            f"{PROMPT_VERSION}:{schema_id}:{request_hasher.hexdigest()}"
+        )
+
+    def _get_disk_cache(self) -> diskcache.Cache:
+        """Return the on-disk result cache, opening it on first use. Blocking."""
+        with self._disk_cache_lock:
+            if self._disk_cache is None:
+                self._disk_cache = diskcache.Cache(settings.CACHE_DIR)
+            return self._disk_cache
+
+    def _disk_cache_get(self, cache_key: str) -> Optional[str]:
+        return self._get_disk_cache().get(cache_key)
+
+    def _disk_cache_set(self, cache_key: str, value: str) -> None:
+        self._get_disk_cache().set(cache_key, value, expire=settings.ANALYSIS_CACHE_TTL)
+
+    async def _cache_get(self, cache_key: str) -> Optional[ImageAnalysisResult]:
+        """Look up a cached result, returning a copy the caller may mutate."""
+        cached = self._result_cache.get(cache_key)
+        if cached is None:
+            # diskcache does blocking SQLite and file I/O
+            cached_json = await asyncio.to_thread(self._disk_cache_get, cache_key)
+            if cached_json is not None:
+                cached = ImageAnalysisResult.model_validate_json(cached_json)
+                self._result_cache[cache_key] = cached
+        return cached.model_copy(deep=True) if cached is not None else None
+
+    async def _cache_put(self, cache_key: str, result: ImageAnalysisResult) -> None:
+        self._result_cache[cache_key] = result
+        await asyncio.to_thread(self._disk_cache_set, cache_key, result.model_dump_json())
+
+    def _parse_analysis(self, content: str) -> ImageAnalysisResult:
+        """Parse Gemini's JSON text into an ImageAnalysisResult."""
+        # Strip markdown code blocks if present
+        m = _FENCE.match(content)
+        content = m.group(1) if m else content.strip()
+
+        # Parse JSON response
+        analysis_data = orjson.loads(content)
+
+        # Extract jersey detection data if present (team mode)
+        CONFIDENCE_THRESHOLD = 0.90
+        jersey_detection = analysis_data.get("jersey_detection", {})
+
+        # Filter primary jersey by confidence threshold
+        primary_jersey_number = jersey_detection.get("primary_jersey_number")
+        jersey_confidence = jersey_detection.get("jersey_confidence")
+
+        # Don't report primary jersey if confidence is too low
+        if jersey_confidence and jersey_confidence < CONFIDENCE_THRESHOLD:
+            logger.info(f"⚠️ Primary jersey #{primary_jersey_number} confidence too low ({jersey_confidence:.2f} < {CONFIDENCE_THRESHOLD}), filtering out")
+            primary_jersey_number = None
+            jersey_confidence = None
+
+        is_group_photo = jersey_detection.get("is_group_photo", False)
+
+        # Filter detected jerseys by confidence threshold and collect player
+        # names from high-confidence detections in a single pass
+        all_detected_jerseys = jersey_detection.get("detected_jersey_numbers", [])
+        detected_jersey_numbers = []
+        player_names = []
+        filtered_count = 0
+        for jersey in all_detected_jerseys:
+            if jersey.get("confidence", 0) >= CONFIDENCE_THRESHOLD:
+                detected_jersey_numbers.append(jersey)
+                player_name = jersey.get("player_name")
+                if player_name:
+                    player_names.append(player_name)
+            else:
+                filtered_count += 1
+
+        # Log filtered vs total detections
+        if is_group_photo and filtered_count > 0:
+            logger.info(f"🔍 Filtered out {filtered_count} low-confidence detections (below {CONFIDENCE_THRESHOLD*100}%)")
+
+        # Validate the whole response in one pass; nested models are built by
+        # pydantic-core instead of one Python-orchestrated constructor per model
+        result = ImageAnalysisResult.model_validate({
+            **analysis_data,
+            "quality_tier": _TIER_MAP.get(analysis_data.get("quality_tier"), analysis_data.get("quality_tier")),
+            # Recommendation blocks with no non-null content are treated as
+            # absent, so pydantic never builds an all-default sub-model
+            "camera_settings": _non_empty_block(analysis_data.get("camera_settings")),
+            "post_processing": _non_empty_block(analysis_data.get("post_processing")),
+            "jersey_number": primary_jersey_number,
+            "jersey_confidence": jersey_confidence,
+            "is_group_photo": is_group_photo,
+            "detected_jersey_numbers": detected_jersey_numbers,
+            "player_names": player_names
+        })
+
+        logger.info(f"Analysis completed: Overall score {result.overall_score}, Tier: {result.quality_tier}")
+        if is_group_photo:
+            logger.info(f"🎯 GROUP PHOTO detected with {len(detected_jersey_numbers)} players: {', '.join(player_names)}")
+            for jersey in detected_jersey_numbers:
+                logger.info(f"  - #{jersey.get('number')} {jersey.get('player_name', 'Unknown')} (confidence: {jersey.get('confidence', 0):.2f})")
+        elif primary_jersey_number:
+            logger.info(f"Jersey detected: #{primary_jersey_number} (confidence: {jersey_confidence})")
+
+        return result
 
     async def analyze_image(
         self,
@@ -287,49 +876,43 @@ Provide response in this EXACT JSON format:
         Returns:
             ImageAnalysisResult with all scoring factors
         """
-        try:
-            # Load image
-            img = Image.open(image_path)
-
-            # OPTIMIZATION 1: Resize large images to max 2048px (preserves quality, 5-10x faster)
-            max_dimension = 2048
-            if img.width > max_dimension or img.height > max_dimension:
-                logger.info(f"Resizing image from {img.width}x{img.height} to fit {max_dimension}px")
-                # Calculate new dimensions maintaining aspect ratio
-                if img.width > img.height:
-                    new_width = max_dimension
-                    new_height = int((max_dimension / img.width) * img.height)
-                else:
-                    new_height = max_dimension
-                    new_width = int((max_dimension / img.height) * img.width)
-
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                logger.info(f"Resized to {new_width}x{new_height}")
+        from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted
 
+        try:
             # Create prompt
             prompt = self._create_analysis_prompt(exif_data, sequence_info, team_mode, player_roster, team_colors)
 
+            cache_key = await self._cache_key(image_path, prompt, team_mode, team_logo_path if team_mode else None)
+            cached = await self._cache_get(cache_key)
+            if cached is not None:
+                logger.info("Returning cached analysis result (identical image and prompt)")
+                return cached
+
+            # Opt-in: skip the API for images that are obviously unusable. Runs
+            # after the cache lookup so cached images aren't decoded again
+            if settings.ENABLE_LOCAL_PRESCREEN:
+                reject_reason = await asyncio.to_thread(_prescreen, image_path)
+                if reject_reason:
+                    logger.info(f"Local pre-screen rejected {image_path}: {reject_reason}")
+                    return _prescreen_reject(reject_reason)
+
+            # Decode/resize/encode on a worker thread so the event loop stays free
+            image_part = {
+                "mime_type": "image/jpeg",
+                "data": await asyncio.to_thread(_decode_and_prepare, image_path)
+            }
+
             # Prepare content for Gemini
-            content_parts = [prompt, img]
+            content_parts = [prompt, image_part]
 
             # Add team logo if provided in team mode
             if team_mode and team_logo_path:
                 try:
-                    logo_img = Image.open(team_logo_path)
-                    # Resize logo to reasonable size (max 512px)
-                    max_logo_size = 512
-                    if logo_img.width > max_logo_size or logo_img.height > max_logo_size:
-                        if logo_img.width > logo_img.height:
-                            new_width = max_logo_size
-                            new_height = int((max_logo_size / logo_img.width) * logo_img.height)
-                        else:
-                            new_height = max_logo_size
-                            new_width = int((max_logo_size / logo_img.height) * logo_img.width)
-                        logo_img = logo_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                    logo_part = await asyncio.to_thread(_load_logo, team_logo_path)
 
                     # Add logo to content with context
                     content_parts.insert(1, "Team Logo (for reference):")
-                    content_parts.insert(2, logo_img)
+                    content_parts.insert(2, logo_part)
                     logger.info("Added team logo to analysis")
                 except Exception as e:
                     logger.warning(f"Failed to load team logo: {e}")
@@ -339,20 +922,22 @@ Provide response in this EXACT JSON format:
 
             max_retries = 3
             retry_delay = 2  # Start with 2 seconds
-            last_error = None
+
+            # Plain dict, accepted by the SDK as generation_config
+            primary_tokens = _primary_token_budget(team_mode, len(player_roster or []))
+            generation_config = _generation_config_fields(primary_tokens, team_mode)
 
             for attempt in range(max_retries):
                 try:
-                    response = self.model.generate_content(
+                    # Stream so parsing can start the moment the JSON object closes
+                    response = await self.model.generate_content_async(
                         content_parts,
-                        generation_config=genai.GenerationConfig(
-                            temperature=0.3,
-                            max_output_tokens=6144  # Optimized: Reduced from 8192, but enough for full JSON responses
-                        )
+                        generation_config=generation_config,
+                        stream=True
                     )
+                    streamed, last_chunk = await _read_json_stream(response)
                     break  # Success, exit retry loop
                 except (DeadlineExceeded, ResourceExhausted) as e:
-                    last_error = e
                     if attempt < max_retries - 1:
                         logger.warning(f"Gemini API timeout/rate limit (attempt {attempt + 1}/{max_retries}). Retrying in {retry_delay}s...")
                         await asyncio.sleep(retry_delay)
@@ -361,157 +946,77 @@ Provide response in this EXACT JSON format:
                         logger.error(f"Gemini API failed after {max_retries} attempts")
                         raise ValueError(f"Gemini API timeout after {max_retries} retries. Please try again later.") from e
 
-            # Parse response
-            logger.info(f"Gemini response candidates count: {len(response.candidates) if hasattr(response, 'candidates') else 0}")
-
-            # Check if we have candidates
-            if not response.candidates or len(response.candidates) == 0:
-                logger.error("No candidates in Gemini response")
-                logger.error(f"Response prompt_feedback: {response.prompt_feedback if hasattr(response, 'prompt_feedback') else 'N/A'}")
-                raise ValueError("Gemini did not return any analysis candidates. The image may have been blocked by safety filters.")
-
-            # Check the candidate's finish_reason
-            candidate = response.candidates[0]
-            finish_reason = candidate.finish_reason if hasattr(candidate, 'finish_reason') else None
-            logger.info(f"Candidate finish_reason: {finish_reason}")
-            logger.info(f"Candidate safety_ratings: {candidate.safety_ratings if hasattr(candidate, 'safety_ratings') else 'N/A'}")
-
-            # Check if response was truncated due to max tokens (finish_reason == 2)
-            if finish_reason == 2:
-                logger.warning("Response truncated due to MAX_TOKENS. Retrying with increased token limit...")
-                # Retry with higher token limit using full content_parts (includes team logo if present)
-                response = self.model.generate_content(
-                    content_parts,
-                    generation_config=genai.GenerationConfig(
-                        temperature=0.3,
-                        max_output_tokens=8192  # Increased limit for retry
-                    )
-                )
-                if response.candidates and len(response.candidates) > 0:
-                    candidate = response.candidates[0]
-                    finish_reason = candidate.finish_reason if hasattr(candidate, 'finish_reason') else None
-                    logger.info(f"Retry finish_reason: {finish_reason}")
-                else:
-                    raise ValueError("Retry failed: No candidates returned")
-
-            # Try to get content - handle different response formats
-            content = None
-            try:
-                # Try the simple text accessor first
-                content = response.text
-                logger.info("Got response using response.text accessor")
-            except (ValueError, AttributeError) as e:
-                logger.info(f"response.text failed ({e}), trying parts accessor...")
-                # Fall back to parts accessor
-                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                    parts = candidate.content.parts
-                    if parts and len(parts) > 0:
-                        content = parts[0].text
-                        logger.info("Got response using parts accessor")
+            salvaged = False
+            if streamed is not None:
+                # Complete JSON object received; the usual finish_reason and
+                # content checks only matter when it isn't
+                content = streamed
+                result = self._parse_analysis(content)
+                usage_source = last_chunk
+            else:
+                # Check if we have candidates
+                if not response.candidates:
+                    logger.error("No candidates in Gemini response")
+                    logger.error(f"Response prompt_feedback: {getattr(response, 'prompt_feedback', 'N/A')}")
+                    raise ValueError("Gemini did not return any analysis candidates. The image may have been blocked by safety filters.")
+
+                # Check the candidate's finish_reason
+                candidate = response.candidates[0]
+                finish_reason = getattr(candidate, 'finish_reason', None)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Candidate finish_reason: {finish_reason}")
+                    logger.debug(f"Candidate safety_ratings: {getattr(candidate, 'safety_ratings', 'N/A')}")
+
+                # Check if response was truncated due to max tokens (finish_reason == 2)
+                result = None
+                if finish_reason == 2:
+                    # The truncated JSON often already holds every required field;
+                    # salvaging it avoids a second, larger API call
+                    result = self._salvage_truncated(response, team_mode)
+                    salvaged = result is not None
+                    if salvaged:
+                        logger.info("Recovered analysis from truncated response, skipping MAX_TOKENS retry")
                     else:
-                        logger.error("No parts in candidate content")
-                        logger.error(f"Candidate content: {candidate.content if hasattr(candidate, 'content') else 'N/A'}")
-                        raise ValueError(f"Gemini response blocked. Finish reason: {finish_reason}")
-
-            if not content:
-                raise ValueError("Could not extract content from Gemini response")
-
-            logger.info(f"Gemini response: {content[:200]}...")
-
-            # Strip markdown code blocks if present
-            content = content.strip()
-            if content.startswith("```json"):
-                content = content[7:]  # Remove ```json
-            elif content.startswith("```"):
-                content = content[3:]  # Remove ```
-
-            if content.endswith("```"):
-                content = content[:-3]  # Remove trailing ```
-
-            content = content.strip()
-
-            # Parse JSON response
-            analysis_data = json.loads(content)
-
-            # Convert to Pydantic models
-            factor_scores = ImageFactorScores(**analysis_data["factor_scores"])
-            subject_analysis = SubjectAnalysis(**analysis_data["subject_analysis"])
-
-            # Parse camera settings if present
-            camera_settings = None
-            if "camera_settings" in analysis_data and analysis_data["camera_settings"]:
-                camera_settings = CameraSettingsRecommendations(**analysis_data["camera_settings"])
-
-            # Parse post-processing recommendations if present
-            post_processing = None
-            if "post_processing" in analysis_data and analysis_data["post_processing"]:
-                post_processing = PostProcessingRecommendations(**analysis_data["post_processing"])
-
-            # Extract jersey detection data if present (team mode)
-            CONFIDENCE_THRESHOLD = 0.90
-            jersey_detection = analysis_data.get("jersey_detection", {})
-
-            # Filter primary jersey by confidence threshold
-            primary_jersey_number = jersey_detection.get("primary_jersey_number")
-            jersey_confidence = jersey_detection.get("jersey_confidence")
-
-            # Don't report primary jersey if confidence is too low
-            if jersey_confidence and jersey_confidence < CONFIDENCE_THRESHOLD:
-                logger.info(f"⚠️ Primary jersey #{primary_jersey_number} confidence too low ({jersey_confidence:.2f} < {CONFIDENCE_THRESHOLD}), filtering out")
-                primary_jersey_number = None
-                jersey_confidence = None
-
-            is_group_photo = jersey_detection.get("is_group_photo", False)
-
-            # Filter detected jerseys by confidence threshold (80% minimum)
-            all_detected_jerseys = jersey_detection.get("detected_jersey_numbers", [])
-            detected_jersey_numbers = [
-                jersey for jersey in all_detected_jerseys
-                if jersey.get("confidence", 0) >= CONFIDENCE_THRESHOLD
-            ]
-
-            # Extract player names from high-confidence detections only
-            player_names = [
-                jersey.get("player_name")
-                for jersey in detected_jersey_numbers
-                if jersey.get("player_name")
-            ]
-
-            # Log filtered vs total detections
-            if is_group_photo and all_detected_jerseys:
-                filtered_count = len(all_detected_jerseys) - len(detected_jersey_numbers)
-                if filtered_count > 0:
-                    logger.info(f"🔍 Filtered out {filtered_count} low-confidence detections (below {CONFIDENCE_THRESHOLD*100}%)")
-
-            result = ImageAnalysisResult(
-                overall_score=analysis_data["overall_score"],
-                quality_tier=QualityTier(analysis_data["quality_tier"]),
-                factor_scores=factor_scores,
-                detected_issues=analysis_data.get("detected_issues", []),
-                critical_defects=analysis_data.get("critical_defects", []),
-                is_reject=analysis_data.get("is_reject", False),
-                ai_summary=analysis_data["ai_summary"],
-                recommendations=analysis_data.get("recommendations", []),
-                subject_analysis=subject_analysis,
-                camera_settings=camera_settings,
-                post_processing=post_processing,
-                jersey_number=primary_jersey_number,
-                jersey_confidence=jersey_confidence,
-                is_group_photo=is_group_photo,
-                detected_jersey_numbers=detected_jersey_numbers,
-                player_names=player_names
-            )
-
-            logger.info(f"Analysis completed: Overall score {result.overall_score}, Tier: {result.quality_tier}")
-            if is_group_photo:
-                logger.info(f"🎯 GROUP PHOTO detected with {len(detected_jersey_numbers)} players: {', '.join(player_names)}")
-                for jersey in detected_jersey_numbers:
-                    logger.info(f"  - #{jersey.get('number')} {jersey.get('player_name', 'Unknown')} (confidence: {jersey.get('confidence', 0):.2f})")
-            elif primary_jersey_number:
-                logger.info(f"Jersey detected: #{primary_jersey_number} (confidence: {jersey_confidence})")
-            return result
-
-        except json.JSONDecodeError as e:
+                        retry_tokens = self._retry_token_budget(primary_tokens)
+                        logger.warning(f"Response truncated due to MAX_TOKENS. Retrying with max_output_tokens={retry_tokens}...")
+                        # Retry with higher token limit, reusing the already-built content_parts
+                        # (prompt, encoded image and team logo if present)
+                        response = await self.model.generate_content_async(
+                            content_parts,
+                            generation_config=_generation_config_fields(retry_tokens, team_mode)
+                        )
+                        if not response.candidates:
+                            raise ValueError("Retry failed: No candidates returned")
+                        finish_reason = getattr(response.candidates[0], 'finish_reason', None)
+                        logger.info(f"Retry finish_reason: {finish_reason}")
+
+                if result is None:
+                    # Simple text accessor first, falling back to the first part
+                    try:
+                        content = response.text
+                    except (ValueError, AttributeError):
+                        try:
+                            content = response.candidates[0].content.parts[0].text
+                        except (IndexError, AttributeError) as e:
+                            raise ValueError(f"Gemini response blocked. Finish reason: {finish_reason}") from e
+
+                    if not content:
+                        raise ValueError("Could not extract content from Gemini response")
+
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"Gemini response: {content[:200]}...")
+
+                    result = self._parse_analysis(content)
+                usage_source = response
+
+            self._record_output_tokens(usage_source)
+            # A salvaged result is missing whatever was cut off; leave it
+            # uncached so the next request can get the full answer
+            if not salvaged:
+                await self._cache_put(cache_key, result)
+            return result.model_copy(deep=True)
+
+        except json.JSONDecodeError as e:  # also raised by orjson.loads (subclass)
             logger.error(f"Failed to parse Gemini response as JSON: {e}")
             logger.error(f"Response content: {content}")
             raise ValueError(f"Invalid JSON response from Gemini: {e}")
@@ -526,7 +1031,7 @@ Provide response in this EXACT JSON format:
         sequence_info_list: Optional[list[Dict]] = None
     ) -> list[ImageAnalysisResult]:
         """
-        Analyze multiple images in sequence.
+        Analyze multiple images concurrently.
 
         Args:
             image_paths: List of image file paths
@@ -536,22 +1041,179 @@ Provide response in this EXACT JSON format:
         Returns:
             List of ImageAnalysisResult objects
         """
-        results = []
-
         exif_data_list = exif_data_list or [None] * len(image_paths)
         sequence_info_list = sequence_info_list or [None] * len(image_paths)
 
+        # Group identical requests (same file contents and prompt) so each is
+        # analyzed once and the result fanned back out to every alias
+        groups: Dict[str, list[int]] = {}
         for i, image_path in enumerate(image_paths):
             try:
-                result = await self.analyze_image(
-                    image_path,
-                    exif_data_list[i],
-                    sequence_info_list[i]
-                )
-                results.append(result)
+                prompt = self._create_analysis_prompt(exif_data_list[i], sequence_info_list[i])
+                cache_key = await self._cache_key(image_path, prompt)
             except Exception as e:
                 logger.error(f"Failed to analyze {image_path}: {e}")
-                # Continue with other images
                 continue
+            groups.setdefault(cache_key, []).append(i)
+
+        if len(groups) < len(image_paths):
+            logger.info(f"Batch of {len(image_paths)} images contains {len(groups)} unique requests")
+
+        # Gemini calls are network-bound, so run unique requests concurrently,
+        # bounded to stay within API rate limits
+        semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY or 8)
+
+        async def analyze_one(i: int) -> Optional[ImageAnalysisResult]:
+            async with semaphore:
+                try:
+                    return await self.analyze_image(
+                        image_paths[i],
+                        exif_data_list[i],
+                        sequence_info_list[i]
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to analyze {image_paths[i]}: {e}")
+                    # Continue with other images
+                    return None
+
+        group_indices = list(groups.values())
+        group_results = await asyncio.gather(*(analyze_one(indices[0]) for indices in group_indices))
+
+        results: list[Optional[ImageAnalysisResult]] = [None] * len(image_paths)
+        for indices, result in zip(group_indices, group_results):
+            if result is None:
+                continue
+            results[indices[0]] = result
+            for i in indices[1:]:
+                results[i] = result.model_copy(deep=True)
+
+        return [result for result in results if result is not None]
+
+    async def batch_analyze_images_offline(
+        self,
+        image_paths: list[str],
+        exif_data_list: Optional[list[Dict]] = None,
+        sequence_info_list: Optional[list[Dict]] = None,
+        poll_interval: float = 30.0
+    ) -> list[ImageAnalysisResult]:
+        """
+        Analyze multiple images through the Gemini Batch API.
+
+        Requests are submitted as server-side batch jobs and polled until
+        done, trading latency (minutes to hours) for lower cost and higher
+        throughput. Use batch_analyze_images for interactive culling.
 
-        return results
+        Args:
+            image_paths: List of image file paths
+            exif_data_list: Optional list of EXIF data dicts
+            sequence_info_list: Optional list of sequence info dicts
+            poll_interval: Seconds between job status checks
+
+        Returns:
+            List of ImageAnalysisResult objects (failed images are skipped)
+        """
+        exif_data_list = exif_data_list or [None] * len(image_paths)
+        sequence_info_list = sequence_info_list or [None] * len(image_paths)
+
+        results: list[Optional[ImageAnalysisResult]] = [None] * len(image_paths)
+        pending: list[tuple[int, str, Dict[str, Any]]] = []  # (index, cache_key, request)
+
+        for i, image_path in enumerate(image_paths):
+            try:
+                prompt = self._create_analysis_prompt(exif_data_list[i], sequence_info_list[i])
+                cache_key = await self._cache_key(image_path, prompt)
+                cached = await self._cache_get(cache_key)
+                if cached is not None:
+                    results[i] = cached
+                    continue
+
+                image_bytes = await asyncio.to_thread(_decode_and_prepare, image_path)
+                pending.append((i, cache_key, {
+                    "contents": [{
+                        "role": "user",
+                        "parts": [
+                            {"text": prompt},
+                            {"inline_data": {
+                                "mime_type": "image/jpeg",
+                                "data": base64.b64encode(image_bytes).decode()
+                            }}
+                        ]
+                    }],
+                    "generation_config": _generation_config_fields(_PRIMARY_MAX_TOKENS, False)
+                }))
+            except Exception as e:
+                logger.error(f"Failed to prepare {image_path} for batch analysis: {e}")
+
+        # Split into jobs that stay under the inline request size limit
+        jobs: list[list[tuple[int, str, Dict[str, Any]]]] = []
+        job_size = 0
+        for item in pending:
+            item_size = len(item[2]["contents"][0]["parts"][1]["inline_data"]["data"])
+            if not jobs or job_size + item_size > _BATCH_INLINE_LIMIT:
+                jobs.append([])
+                job_size = 0
+            jobs[-1].append(item)
+            job_size += item_size
+
+        async with httpx.AsyncClient(
+            base_url=_BATCH_API_BASE,
+            headers={"x-goog-api-key": settings.GEMINI_API_KEY},
+            timeout=120.0
+        ) as client:
+            for job in jobs:
+                try:
+                    responses = await self._run_batch_job(client, [request for _, _, request in job], poll_interval)
+                except Exception as e:
+                    logger.error(f"Gemini batch job failed: {e}")
+                    continue
+
+                for (i, cache_key, _), response in zip(job, responses):
+                    try:
+                        if "error" in response:
+                            raise ValueError(response["error"].get("message", response["error"]))
+                        content = response["response"]["candidates"][0]["content"]["parts"][0]["text"]
+                        result = self._parse_analysis(content)
+                        await self._cache_put(cache_key, result)
+                        results[i] = result.model_copy(deep=True)
+                    except Exception as e:
+                        logger.error(f"Failed to analyze {image_paths[i]}: {e}")
+
+        return [result for result in results if result is not None]
+
+    async def _run_batch_job(
+        self,
+        client: httpx.AsyncClient,
+        requests: list[Dict[str, Any]],
+        poll_interval: float
+    ) -> list[Dict[str, Any]]:
+        """Submit one inline batch job, wait for it to finish and return its responses in order."""
+        response = await client.post(
+            f"/models/{settings.GEMINI_MODEL}:batchGenerateContent",
+            json={
+                "batch": {
+                    "display_name": f"unfuzz-analysis-{datetime.now():%Y%m%d-%H%M%S}",
+                    "input_config": {
+                        "requests": {"requests": [{"request": request} for request in requests]}
+                    }
+                }
+            }
+        )
+        response.raise_for_status()
+        batch_name = response.json()["name"]
+        logger.info(f"Submitted Gemini batch job {batch_name} with {len(requests)} requests")
+
+        while True:
+            await asyncio.sleep(poll_interval)
+            response = await client.get(f"/{batch_name}")
+            response.raise_for_status()
+            operation = response.json()
+            state = operation.get("metadata", {}).get("state")
+            if state in _BATCH_DONE_STATES or operation.get("done"):
+                break
+            logger.info(f"Gemini batch job {batch_name} state: {state}")
+
+        if state != "BATCH_STATE_SUCCEEDED":
+            raise ValueError(f"Gemini batch job {batch_name} finished with state {state}")
+
+        output = operation.get("response") or operation["metadata"].get("output", {})
+        return output.get("inlinedResponses", {}).get("inlinedResponses", [])
@@ -1,27 +1,32 @@
 import base64
 import json
+import orjson
 from typing import Dict, Any, Optional
 from openai import AsyncOpenAI
 from app.core.config import settings
-from app.models.image import ImageAnalysisResult, ImageFactorScores, SubjectAnalysis, QualityTier
+from app.models.image import ImageAnalysisResult
 import logging
+import asyncio
 
 logger = logging.getLogger(__name__)
 
+_ENCODE_CHUNK_SIZE = 3 * 65536  # Divisible by 3: base64 chunks concatenate cleanly
 
-class OpenAIVisionService:
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        self.model = settings.OPENAI_MODEL
 
-    def _encode_image(self, image_path: str) -> str:
-        """Encode image to base64 for OpenAI API."""
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+def _json_default(obj: Any) -> Any:
+    """orjson fallback for EXIF values it can't serialize natively (e.g. IFDRational)."""
+    return str(obj)
 
-    def _create_analysis_prompt(self, exif_data: Optional[Dict] = None, sequence_info: Optional[Dict] = None) -> str:
-        """Create comprehensive analysis prompt for OpenAI Vision API."""
-        prompt = """
+
+def _dumps(data: Any) -> str:
+    """Compact JSON for embedding in the prompt."""
+    return orjson.dumps(data, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+class OpenAIVisionService:
+    # Static prompt pieces, built once at class creation; only the EXIF and
+    # sequence sections vary per image
+    _BASE_PROMPT = """
 Analyze this photograph as a professional photography expert. Evaluate the image across these specific criteria and provide scores (0-100) for each:
 
 TECHNICAL QUALITY (12 factors):
@@ -113,15 +118,35 @@ Provide response in this EXACT JSON format:
 }
 """
 
+    _PROMPT_SUFFIX = "\n\nBe critical but fair. Apply professional photography standards. Closed eyes or blinks should result in rejection (is_reject: true, eye_status score: 0). Return ONLY valid JSON."
+
+    def __init__(self):
+        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.model = settings.OPENAI_MODEL
+
+    def _encode_image(self, image_path: str) -> str:
+        """Encode image to base64 for OpenAI API."""
+        # Encode in chunks that are a multiple of 3 bytes so no padding lands
+        # mid-stream; avoids holding the raw file and its encoding at once
+        encoded = bytearray()
+        with open(image_path, "rb", buffering=_ENCODE_CHUNK_SIZE) as image_file:
+            while chunk := image_file.read(_ENCODE_CHUNK_SIZE):
+                encoded += base64.b64encode(chunk)
+        return encoded.decode('ascii')
+
+    def _create_analysis_prompt(self, exif_data: Optional[Dict] = None, sequence_info: Optional[Dict] = None) -> str:
+        """Create comprehensive analysis prompt for OpenAI Vision API."""
+        parts = [self._BASE_PROMPT]
+
         if exif_data:
-            prompt += f"\n\nImage EXIF Data:\n{json.dumps(exif_data, indent=2)}"
+            parts.append(f"\n\nImage EXIF Data:\n{_dumps(exif_data)}")
 
         if sequence_info:
-            prompt += f"\n\nSequence Context:\n{json.dumps(sequence_info, indent=2)}"
+            parts.append(f"\n\nSequence Context:\n{_dumps(sequence_info)}")
 
-        prompt += "\n\nBe critical but fair. Apply professional photography standards. Closed eyes or blinks should result in rejection (is_reject: true, eye_status score: 0). Return ONLY valid JSON."
+        parts.append(self._PROMPT_SUFFIX)
 
-        return prompt
+        return "".join(parts)
 
     async def analyze_image(
         self,
@@ -141,8 +166,8 @@ Provide response in this EXACT JSON format:
             ImageAnalysisResult with all scoring factors
         """
         try:
-            # Encode image
-            base64_image = self._encode_image(image_path)
+            # Encode image off the event loop (disk read + base64)
+            base64_image = await asyncio.to_thread(self._encode_image, image_path)
 
             # Create prompt
             prompt = self._create_analysis_prompt(exif_data, sequence_info)
@@ -182,28 +207,25 @@ Provide response in this EXACT JSON format:
             logger.info(f"OpenAI response: {content[:200]}...")
 
             # Parse JSON response
-            analysis_data = json.loads(content)
-
-            # Convert to Pydantic models
-            factor_scores = ImageFactorScores(**analysis_data["factor_scores"])
-            subject_analysis = SubjectAnalysis(**analysis_data["subject_analysis"])
-
-            result = ImageAnalysisResult(
-                overall_score=analysis_data["overall_score"],
-                quality_tier=QualityTier(analysis_data["quality_tier"]),
-                factor_scores=factor_scores,
-                detected_issues=analysis_data.get("detected_issues", []),
-                critical_defects=analysis_data.get("critical_defects", []),
-                is_reject=analysis_data.get("is_reject", False),
-                ai_summary=analysis_data["ai_summary"],
-                recommendations=analysis_data.get("recommendations", []),
-                subject_analysis=subject_analysis
-            )
+            analysis_data = orjson.loads(content)
+
+            # Validate in one pass; pydantic-core builds the nested models
+            result = ImageAnalysisResult.model_validate({
+                "overall_score": analysis_data["overall_score"],
+                "quality_tier": analysis_data["quality_tier"],
+                "factor_scores": analysis_data["factor_scores"],
+                "detected_issues": analysis_data.get("detected_issues", []),
+                "critical_defects": analysis_data.get("critical_defects", []),
+                "is_reject": analysis_data.get("is_reject", False),
+                "ai_summary": analysis_data["ai_summary"],
+                "recommendations": analysis_data.get("recommendations", []),
+                "subject_analysis": analysis_data["subject_analysis"]
+            })
 
             logger.info(f"Analysis completed: Overall score {result.overall_score}, Tier: {result.quality_tier}")
             return result
 
-        except json.JSONDecodeError as e:
+        except json.JSONDecodeError as e:  # also raised by orjson.loads (subclass)
             logger.error(f"Failed to parse OpenAI response as JSON: {e}")
             logger.error(f"Response content: {content}")
             raise ValueError(f"Invalid JSON response from OpenAI: {e}")
@@ -218,7 +240,7 @@ Provide response in this EXACT JSON format:
         sequence_info_list: Optional[list[Dict]] = None
     ) -> list[ImageAnalysisResult]:
         """
-        Analyze multiple images in sequence.
+        Analyze multiple images concurrently.
 
         Args:
             image_paths: List of image file paths
@@ -228,22 +250,25 @@ Provide response in this EXACT JSON format:
         Returns:
             List of ImageAnalysisResult objects
         """
-        results = []
-
         exif_data_list = exif_data_list or [None] * len(image_paths)
         sequence_info_list = sequence_info_list or [None] * len(image_paths)
 
-        for i, image_path in enumerate(image_paths):
-            try:
-                result = await self.analyze_image(
-                    image_path,
-                    exif_data_list[i],
-                    sequence_info_list[i]
-                )
-                results.append(result)
-            except Exception as e:
-                logger.error(f"Failed to analyze {image_path}: {e}")
-                # Continue with other images
-                continue
-
-        return results
+        # Requests are network-bound, so run them concurrently, bounded to
+        # stay within API rate limits
+        semaphore = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY or 8)
+
+        async def analyze_one(i: int) -> Optional[ImageAnalysisResult]:
+            async with semaphore:
+                try:
+                    return await self.analyze_image(
+                        image_paths[i],
+                        exif_data_list[i],
+                        sequence_info_list[i]
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to analyze {image_paths[i]}: {e}")
+                    # Continue with other images
+                    return None
+
+        results = await asyncio.gather(*(analyze_one(i) for i in range(len(image_paths))))
+        return [result for result in results if result is not None]
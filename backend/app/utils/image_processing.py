@@ -1,12 +1,437 @@
-from PIL import Image, ExifTags
+from PIL import Image, ExifTags, ImageOps
+from PIL.TiffImagePlugin import IFDRational
 import piexif
 from typing import Dict, Any, Optional, Tuple
 from datetime import datetime
+import asyncio
+import io
 import logging
 import os
+import struct
+from functools import lru_cache, partial
+
+from app.core.config import settings
+from app.core.process_pool import get_process_pool
 
 logger = logging.getLogger(__name__)
 
+# piexif (ifd, tag id) pairs holding rationals, which are wrapped in
+# IFDRational so they format like PIL's (e.g. "1/125" shutter speeds)
+_PIEXIF_RATIONAL_TAGS = frozenset(
+    (ifd, tag_id)
+    for ifd in ('0th', 'Exif', 'GPS')
+    for tag_id, info in piexif.TAGS[ifd].items()
+    if info['type'] in (piexif.TYPES.Rational, piexif.TYPES.SRational)
+)
+
+
+def _piexif_rational(value: Any) -> Any:
+    if isinstance(value, tuple) and len(value) == 2 and type(value[0]) is int:
+        return IFDRational(*value)
+    if isinstance(value, tuple) and value and isinstance(value[0], tuple):
+        # Multi-valued rationals (LensSpecification, GPS coordinates)
+        return tuple(_piexif_rational(item) for item in value)
+    return value
+
+
+def _piexif_values(raw_exif: bytes) -> Dict[str, Any]:
+    """
+    Read every tag from a raw EXIF payload with piexif.
+
+    Same shape as PIL's merged EXIF dict: IFD0 and Exif sub-IFD tags by name,
+    with the GPS IFD nested under GPSInfo.
+    """
+    ifds = piexif.load(raw_exif)
+    values = {}
+    for ifd in ('0th', 'Exif'):
+        for tag_id, value in ifds[ifd].items():
+            if (ifd, tag_id) in _PIEXIF_RATIONAL_TAGS:
+                value = _piexif_rational(value)
+            values[ExifTags.TAGS.get(tag_id, tag_id)] = value
+    if ifds['GPS']:
+        values['GPSInfo'] = {
+            tag_id: _piexif_rational(value) if ('GPS', tag_id) in _PIEXIF_RATIONAL_TAGS else value
+            for tag_id, value in ifds['GPS'].items()
+        }
+    return values
+
+
+def _pil_exif_values(img: Image.Image) -> Dict[str, Any]:
+    """Read every tag through PIL, for formats without a raw EXIF payload (TIFF, RAW)."""
+    exif = img.getexif()
+    if not exif:
+        return {}
+    # Camera settings live in the Exif sub-IFD, Make/Model/DateTime in IFD0
+    merged = dict(exif)
+    merged.update(exif.get_ifd(ExifTags.IFD.Exif))
+    gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    if gps:
+        merged[ExifTags.IFD.GPSInfo] = gps
+    return {ExifTags.TAGS.get(tag_id, tag_id): value for tag_id, value in merged.items()}
+
+
+def _format_ratio(value: float) -> str:
+    return f"{value:.2f}".rstrip('0').rstrip('.')
+
+
+def _rational_to_string(value: Any) -> Optional[str]:
+    # Fractions like 1/125 for shutter speed
+    numerator, denominator = value.numerator, value.denominator
+    if denominator == 1:
+        # Whole numbers stored as rationals (focal lengths, ISO-like fields)
+        return str(numerator)
+    if denominator == 0:
+        return None
+    decimal_value = numerator / denominator
+    if decimal_value == 0:
+        return "0"
+    elif decimal_value < 1:
+        return f"1/{int(1/decimal_value)}"
+    else:
+        return _format_ratio(decimal_value)
+
+
+def _tuple_to_string(value: tuple) -> Optional[str]:
+    # Tuples like focal length (24, 1) = 24mm
+    if len(value) == 2 and isinstance(value[0], (int, float)) and isinstance(value[1], (int, float)):
+        if value[1] == 1 and type(value[0]) is int:
+            return str(value[0])
+        if value[1] == 0:
+            return None
+        result = value[0] / value[1]
+        if result == 0:
+            return "0"
+        return _format_ratio(result)
+    return str(value)
+
+
+def _bytes_to_string(value: bytes) -> Optional[str]:
+    return value.decode('utf-8', errors='ignore').strip()
+
+
+def _exif_to_float(value: Any) -> Optional[float]:
+    # Raw IFDRational, (num, den) tuple or plain number -> float
+    if value is None:
+        return None
+    try:
+        if isinstance(value, tuple):
+            numerator, denominator = value
+        elif isinstance(value, IFDRational):
+            numerator, denominator = value.numerator, value.denominator
+        else:
+            return float(value)
+        return float(numerator) / float(denominator) if denominator != 0 else None
+    except (ValueError, TypeError):
+        return None
+
+
+# Exact-type handlers for _convert_exif_value_to_string; anything not listed
+# falls through to the rational duck-typing check and then str().
+_EXIF_VALUE_HANDLERS = {
+    IFDRational: _rational_to_string,
+    tuple: _tuple_to_string,
+    int: str,
+    float: str,
+    bytes: _bytes_to_string,
+    str: lambda value: value or None,
+}
+
+# Default resampling filter for stored copies and thumbnails. Pillow's LANCZOS
+# is a separable Lanczos3 (horizontal then vertical 1D pass), so it costs
+# little more than bilinear, especially with Pillow-SIMD; keep it rather than
+# downgrading for speed
+_RESAMPLE = Image.Resampling.LANCZOS
+
+# Modes JPEG/WebP storage copies can be written in without converting
+_STORAGE_MODES = frozenset({'RGB', 'L'})
+
+_RAW_EXTENSIONS = frozenset({
+    '.cr2', '.cr3',  # Canon
+    '.nef', '.nrw',  # Nikon
+    '.arw', '.srf', '.sr2',  # Sony
+    '.orf',  # Olympus
+    '.rw2',  # Panasonic
+    '.dng',  # Adobe
+    '.raf',  # Fujifilm
+    '.pef',  # Pentax
+    '.x3f',  # Sigma
+    '.erf',  # Epson
+    '.mrw',  # Minolta
+})
+
+# Leading bytes of the formats accepted for upload (see ALLOWED_EXTENSIONS).
+# TIFF covers most RAW formats (CR2, NEF, ARW, DNG); ORF and RW2 use their own
+# TIFF variants; HEIC and CR3 are ISO-BMFF containers identified by their
+# 'ftyp' major brand.
+_IMAGE_SIGNATURES = (
+    b'\xff\xd8\xff',  # JPEG
+    b'\x89PNG\r\n\x1a\n',  # PNG
+    b'GIF87a', b'GIF89a',  # GIF
+    b'II*\x00', b'MM\x00*',  # TIFF and TIFF-based RAW
+    b'IIRO', b'IIRS', b'IIU\x00',  # Olympus ORF, Panasonic RW2
+    b'FUJIFILMCCD-RAW',  # Fujifilm RAF
+)
+
+
+# ISO-BMFF major brands of HEIF stills/sequences and Canon CR3. Anything else
+# with an 'ftyp' box (MP4, MOV, 3GP video) is rejected
+_IMAGE_FTYP_BRANDS = frozenset({
+    b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1',
+    b'crx ',
+})
+
+
+def _has_image_signature(header: bytes) -> bool:
+    if header.startswith(_IMAGE_SIGNATURES):
+        return True
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return True
+    return header[4:8] == b'ftyp' and header[8:12] in _IMAGE_FTYP_BRANDS
+
+
+# PNG IHDR colour type -> PIL mode (greyscale depends on bit depth)
+_PNG_COLOR_MODES = {2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+# JPEG SOF component count -> PIL mode
+_JPEG_COMPONENT_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+
+
+def _scan_jpeg(f) -> Optional[Tuple[int, int, int, Optional[bytes], bool]]:
+    """
+    Walk the JPEG marker segments after SOI up to the start-of-frame marker.
+
+    Returns (width, height, components, exif, mpf), where exif is the raw Exif
+    APP1 payload if one precedes the frame and mpf tells whether there is a
+    Multi-Picture Format APP2 segment (PIL may report such files as MPO), or
+    None if no frame header is found. Only the header segments are read.
+    """
+    exif = None
+    mpf = False
+    f.seek(2)
+    while True:
+        if f.read(1) != b'\xff':
+            return None
+        marker = f.read(1)
+        while marker == b'\xff':  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0x01 or 0xD0 <= code <= 0xD8:  # standalone markers
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if length < 2:
+            return None
+        # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            frame = f.read(6)
+            if len(frame) < 6:
+                return None
+            height, width, components = struct.unpack('>xHHB', frame)
+            return width, height, components, exif, mpf
+        if code == 0xE1 and exif is None:
+            payload = f.read(length - 2)
+            if payload.startswith(b'Exif\x00\x00'):
+                exif = payload
+            continue
+        if code == 0xE2 and length >= 6:
+            # Always consume the tag so the seek below stays aligned
+            tag = f.read(4)
+            mpf = mpf or tag == b'MPF\x00'
+            f.seek(length - 6, os.SEEK_CUR)
+            continue
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _scan_png(f) -> Optional[Tuple[int, int, str, Optional[bytes]]]:
+    """
+    Read IHDR and any eXIf chunk ahead of the image data.
+
+    Returns (width, height, mode, exif) with exif as the raw TIFF payload.
+    """
+    f.seek(8)
+    exif = None
+    size = mode = None
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            break
+        length, chunk_type = struct.unpack('>I4s', chunk_header)
+        if chunk_type == b'IHDR':
+            width, height, bit_depth, color_type = struct.unpack('>IIBB', f.read(10))
+            size = (width, height)
+            if color_type == 0:
+                mode = {1: '1', 16: 'I;16'}.get(bit_depth, 'L')
+            else:
+                mode = _PNG_COLOR_MODES.get(color_type)
+            f.seek(length - 10 + 4, os.SEEK_CUR)
+        elif chunk_type == b'eXIf':
+            exif = f.read(length)
+            f.seek(4, os.SEEK_CUR)
+        elif chunk_type in (b'IDAT', b'IEND'):
+            # Like PIL, only metadata ahead of the image data is considered
+            break
+        else:
+            f.seek(length + 4, os.SEEK_CUR)
+    if size is None or mode is None:
+        return None
+    return size[0], size[1], mode, exif
+
+
+def _scan_header(image_path: str) -> Optional[Tuple[str, str, int, int, Optional[bytes]]]:
+    """
+    Read (format, mode, width, height, raw_exif) for JPEG and PNG straight from
+    the file headers, without creating a PIL image. Returns None for other
+    formats, truncated headers or unexpected layouts, so callers fall back to
+    PIL. JPEGs with a Multi-Picture segment are left to PIL as well, since it
+    decides between JPEG and MPO from the MP index.
+    """
+    with open(image_path, 'rb') as f:
+        signature = f.read(8)
+        try:
+            if signature.startswith(b'\xff\xd8'):
+                jpeg = _scan_jpeg(f)
+                if jpeg is not None and jpeg[2] in _JPEG_COMPONENT_MODES and not jpeg[4]:
+                    width, height, components, exif, _ = jpeg
+                    return 'JPEG', _JPEG_COMPONENT_MODES[components], width, height, exif
+            elif signature == b'\x89PNG\r\n\x1a\n':
+                png = _scan_png(f)
+                if png is not None:
+                    width, height, mode, exif = png
+                    return 'PNG', mode, width, height, exif
+        except struct.error:
+            pass  # Truncated segment
+    return None
+
+
+def _webp_size(header: bytes) -> Optional[Tuple[int, int]]:
+    chunk = header[12:16]
+    if chunk == b'VP8 ' and header[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and header[20] == 0x2F:
+        bits = int.from_bytes(header[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        return int.from_bytes(header[24:27], 'little') + 1, int.from_bytes(header[27:30], 'little') + 1
+    return None
+
+
+def _header_size(image_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Read (width, height) straight from the file header for JPEG, PNG, GIF and
+    WebP. Returns None for other formats, truncated headers or unexpected
+    layouts, so callers fall back to PIL.
+    """
+    with open(image_path, 'rb') as f:
+        header = f.read(32)
+        if header.startswith(b'\xff\xd8'):
+            jpeg = _scan_jpeg(f)
+            return jpeg[:2] if jpeg is not None else None
+    if header.startswith(b'\x89PNG\r\n\x1a\n') and header[12:16] == b'IHDR' and len(header) >= 24:
+        return struct.unpack('>II', header[16:24])
+    if header[:6] in (b'GIF87a', b'GIF89a') and len(header) >= 10:
+        return struct.unpack('<HH', header[6:10])
+    if len(header) == 32 and header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return _webp_size(header)
+    return None
+
+
+def _optimize_with_vips(
+    image_path: str,
+    output_path: str,
+    max_dimension: int,
+    quality: int,
+    use_webp: bool,
+    subsampling: int,
+    fast: bool,
+    strip_metadata: bool = True
+) -> Optional[Tuple[str, int, int]]:
+    """
+    libvips version of optimize_image_for_storage's resize + encode.
+
+    Image.thumbnail shrinks on load (JPEG DCT scaling, WebP/HEIC scaled
+    decode) and finishes with lanczos3, streaming the image in strips so peak
+    memory stays small regardless of the source resolution.
+
+    Returns None if pyvips/libvips is not installed.
+    """
+    try:
+        import pyvips
+    except (ImportError, OSError) as e:
+        logger.warning(f"USE_LIBVIPS is set but pyvips is unavailable ({e}); using Pillow")
+        return None
+
+    # Applies EXIF orientation like the Pillow path
+    img = pyvips.Image.thumbnail(image_path, max_dimension, height=max_dimension, size='down')
+
+    if use_webp:
+        output_path = os.path.splitext(output_path)[0] + '.webp'
+        img.webpsave(output_path, Q=quality, effort=2 if fast else 4, strip=strip_metadata)
+        logger.info(f"Saved optimized WebP image with libvips: {output_path}")
+    else:
+        output_path = os.path.splitext(output_path)[0] + '.jpg'
+        img.jpegsave(
+            output_path, Q=quality, optimize_coding=True, interlace=True, strip=strip_metadata,
+            subsample_mode='off' if subsampling == 0 else 'on'
+        )
+        logger.info(f"Saved optimized JPEG image with libvips: {output_path}")
+
+    return output_path, img.width, img.height
+
+
+def _apply_exif_orientation(img: Image.Image) -> None:
+    """
+    Rotate/flip img in place according to its EXIF Orientation tag.
+
+    Stored copies and thumbnails are written without EXIF by default, so the
+    orientation has to be baked into the pixels. Call after draft(), since
+    transposing loads the image; target sizes are computed afterwards from
+    the upright dimensions.
+    """
+    ImageOps.exif_transpose(img, in_place=True)
+
+
+def _fit_within(width: int, height: int, max_dimension: int) -> Tuple[int, int]:
+    # Scale so the longest side is max_dimension, maintaining aspect ratio
+    if width > height:
+        return max_dimension, int((max_dimension / width) * height)
+    return int((max_dimension / height) * width), max_dimension
+
+
+def _default_subsampling(max_dimension: int) -> int:
+    # 4:4:4 chroma for print-sized output, 4:2:0 otherwise
+    return 0 if max_dimension >= 2000 else 2
+
+
+def _metadata_params(img: Image.Image, strip_metadata: bool) -> Dict[str, Any]:
+    # Save kwargs for the EXIF block. exif_transpose already dropped the
+    # Orientation tag from img.info, so a kept block can't rotate the output twice
+    # The ICC profile is always kept; dropping it shifts wide-gamut colours
+    icc_profile = img.info.get('icc_profile')
+    if strip_metadata:
+        # Explicit empty payload; the original upload keeps the full EXIF and
+        # extract_exif_data has stored what we use in the database
+        return {'exif': b'', 'icc_profile': icc_profile}
+    return {'exif': img.info.get('exif', b''), 'icc_profile': icc_profile}
+
+
+def _storage_path(output_path: str, use_webp: bool) -> str:
+    return os.path.splitext(output_path)[0] + ('.webp' if use_webp else '.jpg')
+
+
+def _log_size_savings(image_path: str, output_path: str) -> None:
+    original_file_size = os.path.getsize(image_path)
+    optimized_file_size = os.path.getsize(output_path)
+    savings_percent = ((original_file_size - optimized_file_size) / original_file_size) * 100
+
+    logger.info(
+        f"Optimization complete: {original_file_size:,} → {optimized_file_size:,} bytes "
+        f"({savings_percent:.1f}% reduction)"
+    )
+
 
 class ImageProcessor:
     """Utilities for image processing and EXIF extraction."""
@@ -25,44 +450,14 @@ class ImageProcessor:
         if value is None:
             return None
 
-        # Handle IFDRational objects (fractions like 1/125)
-        if hasattr(value, 'numerator') and hasattr(value, 'denominator'):
-            # For fractions, calculate decimal value
-            if value.denominator == 0:
-                return None
-            decimal_value = value.numerator / value.denominator
-            # Format nicely (e.g., "1/125" for shutter speed)
-            if decimal_value == 0:
-                return "0"
-            elif decimal_value < 1:
-                return f"1/{int(1/decimal_value)}"
-            else:
-                return f"{decimal_value:.2f}".rstrip('0').rstrip('.')
-
-        # Handle tuples (like focal length (24, 1) = 24mm)
-        if isinstance(value, tuple):
-            if len(value) == 2 and isinstance(value[0], (int, float)) and isinstance(value[1], (int, float)):
-                if value[1] == 0:
-                    return None
-                result = value[0] / value[1]
-                if result == 0:
-                    return "0"
-                return f"{result:.2f}".rstrip('0').rstrip('.')
-            else:
-                return str(value)
-
-        # Handle numbers
-        if isinstance(value, (int, float)):
-            return str(value)
+        handler = _EXIF_VALUE_HANDLERS.get(type(value))
+        if handler is not None:
+            return handler(value)
 
-        # Handle bytes (some EXIF fields are bytes)
-        if isinstance(value, bytes):
-            try:
-                return value.decode('utf-8', errors='ignore').strip()
-            except:
-                return None
+        # Other rational types (e.g. Fraction)
+        if hasattr(value, 'numerator') and hasattr(value, 'denominator'):
+            return _rational_to_string(value)
 
-        # Already a string or other type
         return str(value) if value else None
 
     @staticmethod
@@ -70,80 +465,90 @@ class ImageProcessor:
         """
         Extract EXIF data from an image.
 
+        Results are cached per (path, mtime, size), so repeated lookups of an
+        unchanged file don't reopen it.
+
         Args:
             image_path: Path to the image file
 
         Returns:
             Dictionary containing EXIF data
         """
+        try:
+            st = os.stat(image_path)
+        except OSError:
+            return ImageProcessor._read_exif_data(image_path)
+        # Copy so callers can't mutate the cached dict
+        return dict(ImageProcessor._exif_for_version(image_path, st.st_mtime_ns, st.st_size))
+
+    @staticmethod
+    @lru_cache(maxsize=2048)
+    def _exif_for_version(image_path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+        return ImageProcessor._read_exif_data(image_path)
+
+    @staticmethod
+    def _read_exif_data(image_path: str) -> Dict[str, Any]:
         exif_data = {}
 
         try:
-            img = Image.open(image_path)
+            # JPEG and PNG: size, mode and the raw EXIF payload come straight
+            # from the header segments. Everything else is opened with PIL
+            # (lazily, so only its header is parsed either)
+            img = None
+            header = _scan_header(image_path)
+            if header is None:
+                img = Image.open(image_path)
+                header = (img.format, img.mode, img.width, img.height, img.info.get('exif'))
+            image_format, mode, width, height, raw_exif = header
 
             # Get basic image info
-            exif_data['width'] = img.width
-            exif_data['height'] = img.height
-            exif_data['format'] = img.format
-            exif_data['mode'] = img.mode
-
-            # Extract EXIF if available
-            if hasattr(img, '_getexif') and img._getexif():
-                exif = img._getexif()
-
-                # Convert all EXIF values to JSON-serializable types
-                for tag_id, value in exif.items():
-                    tag = ExifTags.TAGS.get(tag_id, tag_id)
-                    # Convert to string to ensure JSON serializability
-                    serializable_value = ImageProcessor._convert_exif_value_to_string(value)
-                    if serializable_value is not None:
-                        exif_data[tag] = serializable_value
-
-                # Extract commonly used fields and convert to appropriate types
-                # Strings
-                exif_data['camera_make'] = ImageProcessor._convert_exif_value_to_string(exif_data.get('Make', None))
-                exif_data['camera_model'] = ImageProcessor._convert_exif_value_to_string(exif_data.get('Model', None))
-                exif_data['lens_model'] = ImageProcessor._convert_exif_value_to_string(exif_data.get('LensModel', None))
-                exif_data['shutter_speed'] = ImageProcessor._convert_exif_value_to_string(exif_data.get('ExposureTime', None))
-
-                # Floats - focal_length
-                focal_length_raw = exif_data.get('FocalLength', None)
-                if focal_length_raw is not None:
-                    try:
-                        if hasattr(focal_length_raw, 'numerator') and hasattr(focal_length_raw, 'denominator'):
-                            exif_data['focal_length'] = float(focal_length_raw.numerator) / float(focal_length_raw.denominator) if focal_length_raw.denominator != 0 else None
-                        elif isinstance(focal_length_raw, tuple) and len(focal_length_raw) == 2:
-                            exif_data['focal_length'] = float(focal_length_raw[0]) / float(focal_length_raw[1]) if focal_length_raw[1] != 0 else None
-                        else:
-                            exif_data['focal_length'] = float(focal_length_raw)
-                    except (ValueError, TypeError):
-                        exif_data['focal_length'] = None
+            exif_data['width'] = width
+            exif_data['height'] = height
+            exif_data['format'] = image_format
+            exif_data['mode'] = mode
+
+            # Extract EXIF if available. piexif parses the raw payload directly
+            # without building PIL's Exif mapping; formats without one (TIFF,
+            # RAW) or payloads piexif rejects go through PIL.
+            values = None
+            if raw_exif:
+                try:
+                    values = _piexif_values(raw_exif)
+                except Exception as e:
+                    logger.debug(f"piexif could not parse EXIF from {image_path}: {e}")
+            if values is None:
+                if img is None and not raw_exif:
+                    # JPEG/PNG without an EXIF segment
+                    values = {}
                 else:
-                    exif_data['focal_length'] = None
+                    values = _pil_exif_values(img or Image.open(image_path))
 
-                # Floats - aperture
-                aperture_raw = exif_data.get('FNumber', None)
-                if aperture_raw is not None:
-                    try:
-                        if hasattr(aperture_raw, 'numerator') and hasattr(aperture_raw, 'denominator'):
-                            exif_data['aperture'] = float(aperture_raw.numerator) / float(aperture_raw.denominator) if aperture_raw.denominator != 0 else None
-                        elif isinstance(aperture_raw, tuple) and len(aperture_raw) == 2:
-                            exif_data['aperture'] = float(aperture_raw[0]) / float(aperture_raw[1]) if aperture_raw[1] != 0 else None
-                        else:
-                            exif_data['aperture'] = float(aperture_raw)
-                    except (ValueError, TypeError):
-                        exif_data['aperture'] = None
-                else:
-                    exif_data['aperture'] = None
+            if values:
+                # Store every tag as a JSON-serializable string
+                to_string = ImageProcessor._convert_exif_value_to_string
+                for tag, value in values.items():
+                    serializable_value = to_string(value)
+                    if serializable_value is not None:
+                        exif_data[tag] = serializable_value
 
-                # Integer - ISO
-                iso_raw = exif_data.get('ISOSpeedRatings', None)
-                if iso_raw is not None:
-                    try:
-                        exif_data['iso'] = int(iso_raw)
-                    except (ValueError, TypeError):
-                        exif_data['iso'] = None
-                else:
+                # Typed fields for the metadata columns, alongside the full dict
+                # Strings (converted in the loop above)
+                exif_data['camera_make'] = exif_data.get('Make')
+                exif_data['camera_model'] = exif_data.get('Model')
+                exif_data['lens_model'] = exif_data.get('LensModel')
+                exif_data['shutter_speed'] = exif_data.get('ExposureTime')
+
+                # Floats, from the raw values (the strings above are rounded to 2 decimals)
+                exif_data['focal_length'] = _exif_to_float(values.get('FocalLength'))
+                exif_data['aperture'] = _exif_to_float(values.get('FNumber'))
+
+                # Integer - ISO (some cameras write several values; the first is the one used)
+                iso_raw = values.get('ISOSpeedRatings')
+                if isinstance(iso_raw, tuple):
+                    iso_raw = iso_raw[0] if iso_raw else None
+                try:
+                    exif_data['iso'] = int(iso_raw) if iso_raw is not None else None
+                except (ValueError, TypeError):
                     exif_data['iso'] = None
 
                 # Parse datetime
@@ -168,7 +573,11 @@ class ImageProcessor:
         output_path: str,
         max_dimension: int = 3000,
         quality: int = 90,
-        use_webp: bool = True
+        use_webp: bool = True,
+        subsampling: Optional[int] = None,
+        fast: bool = True,
+        resample: Image.Resampling = _RESAMPLE,
+        strip_metadata: bool = True
     ) -> Tuple[str, int, int]:
         """
         Optimize image for storage by resizing and compressing.
@@ -183,69 +592,195 @@ class ImageProcessor:
             max_dimension: Maximum width or height (default 3000px for print quality)
             quality: JPEG/WebP quality (default 90 for excellent quality)
             use_webp: Use WebP format for better compression
+            subsampling: JPEG chroma subsampling (0 = 4:4:4, 2 = 4:2:0). Defaults
+                to 4:4:4 for print-sized output (max_dimension >= 2000)
+            fast: Use WebP encoder effort 2 instead of 4 (about half the CPU
+                for a <1% size difference on photos)
+            resample: Resampling filter (default Lanczos3; pass
+                Image.Resampling.BOX for high-contrast/HDR sources prone to ringing)
+            strip_metadata: Leave EXIF out of the output (default; 30-80KB on
+                modern cameras). Pass False to carry EXIF and ICC profile over
 
         Returns:
             Tuple of (output_path, final_width, final_height)
         """
+        if subsampling is None:
+            subsampling = _default_subsampling(max_dimension)
+
         try:
-            img = Image.open(image_path)
-            original_size = (img.width, img.height)
-
-            # Convert to RGB if necessary (required for JPEG/WebP)
-            if img.mode not in ('RGB', 'L'):
-                img = img.convert('RGB')
-
-            # Resize if larger than max_dimension
-            needs_resize = img.width > max_dimension or img.height > max_dimension
-            if needs_resize:
-                # Calculate new dimensions maintaining aspect ratio
-                if img.width > img.height:
-                    new_width = max_dimension
-                    new_height = int((max_dimension / img.width) * img.height)
-                else:
-                    new_height = max_dimension
-                    new_width = int((max_dimension / img.height) * img.width)
+            if settings.USE_LIBVIPS:
+                result = _optimize_with_vips(
+                    image_path, output_path, max_dimension, quality, use_webp, subsampling, fast,
+                    strip_metadata
+                )
+                if result is not None:
+                    _log_size_savings(image_path, result[0])
+                    return result
+
+            img = ImageProcessor._open_for_storage(image_path, max_dimension)
+            img = ImageProcessor._resize_for_storage(img, max_dimension, resample)
+            data = ImageProcessor._encode_storage(img, quality, use_webp, subsampling, fast, strip_metadata)
+            output_path = ImageProcessor._write_storage_copy(data, image_path, output_path, use_webp)
+            return output_path, img.width, img.height
 
-                logger.info(f"Resizing image from {img.width}x{img.height} to {new_width}x{new_height}")
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            else:
-                new_width, new_height = img.width, img.height
-                logger.info(f"Image {img.width}x{img.height} is within limits, no resize needed")
+        except Exception as e:
+            logger.error(f"Error optimizing image {image_path}: {e}")
+            raise
 
-            # Determine output format and adjust path
-            if use_webp:
-                # Change extension to .webp
-                output_path = os.path.splitext(output_path)[0] + '.webp'
-                img.save(output_path, "WEBP", quality=quality, method=4, optimize=True)
-                logger.info(f"Saved optimized WebP image: {output_path}")
-            else:
-                # Save as JPEG
-                output_path = os.path.splitext(output_path)[0] + '.jpg'
-                img.save(output_path, "JPEG", quality=quality, optimize=True, progressive=True)
-                logger.info(f"Saved optimized JPEG image: {output_path}")
-
-            # Log size savings
-            original_file_size = os.path.getsize(image_path)
-            optimized_file_size = os.path.getsize(output_path)
-            savings_percent = ((original_file_size - optimized_file_size) / original_file_size) * 100
-
-            logger.info(
-                f"Optimization complete: {original_file_size:,} → {optimized_file_size:,} bytes "
-                f"({savings_percent:.1f}% reduction)"
+    @staticmethod
+    def optimize_with_thumbnail(
+        image_path: str,
+        output_path: str,
+        thumbnail_path: str,
+        max_dimension: int = 3000,
+        quality: int = 90,
+        use_webp: bool = True,
+        subsampling: Optional[int] = None,
+        fast: bool = True,
+        resample: Image.Resampling = _RESAMPLE,
+        strip_metadata: bool = True,
+        thumbnail_size: Tuple[int, int] = (400, 400),
+        thumbnail_quality: int = 82,
+        thumbnail_webp: bool = False
+    ) -> Tuple[str, int, int]:
+        """
+        Write the storage copy and its thumbnail from a single decode of the source.
+
+        The storage copy is produced exactly as by optimize_image_for_storage;
+        the thumbnail is made from the already-resized storage image instead of
+        re-reading and re-decoding the written file.
+
+        Args:
+            image_path: Path to source image
+            output_path: Path for optimized output (extension adjusted as in
+                optimize_image_for_storage)
+            thumbnail_path: Path for thumbnail output
+            max_dimension, quality, use_webp, subsampling, fast, resample,
+            strip_metadata: Storage copy options, as for optimize_image_for_storage
+            thumbnail_size: Tuple of (width, height) for thumbnail
+            thumbnail_quality: JPEG/WebP quality of the thumbnail
+            thumbnail_webp: Write the thumbnail as WebP (extension adjusted to .webp)
+
+        Returns:
+            Tuple of (output_path, final_width, final_height)
+        """
+        if settings.USE_LIBVIPS:
+            # libvips streams the storage copy, so there's no decoded image to share
+            result = ImageProcessor.optimize_image_for_storage(
+                image_path, output_path, max_dimension, quality, use_webp, subsampling, fast,
+                resample, strip_metadata
+            )
+            ImageProcessor.create_thumbnail(
+                result[0], thumbnail_path, size=thumbnail_size, quality=thumbnail_quality,
+                use_webp=thumbnail_webp
             )
+            return result
 
-            return output_path, new_width, new_height
+        if subsampling is None:
+            subsampling = _default_subsampling(max_dimension)
+
+        try:
+            img = ImageProcessor._open_for_storage(image_path, max_dimension)
+            img = ImageProcessor._resize_for_storage(img, max_dimension, resample)
+            data = ImageProcessor._encode_storage(img, quality, use_webp, subsampling, fast, strip_metadata)
+            width, height = img.width, img.height
+
+            # Thumbnail first: if it fails, no storage copy has been written yet
+            # and the caller's fallback starts from a clean slate
+            ImageProcessor._save_thumbnail(
+                img, thumbnail_path, thumbnail_size, thumbnail_quality, use_webp=thumbnail_webp
+            )
+
+            output_path = ImageProcessor._write_storage_copy(data, image_path, output_path, use_webp)
+            return output_path, width, height
 
         except Exception as e:
             logger.error(f"Error optimizing image {image_path}: {e}")
             raise
 
+    @staticmethod
+    async def optimize_with_thumbnail_async(
+        image_path: str,
+        output_path: str,
+        thumbnail_path: str,
+        **kwargs
+    ) -> Tuple[str, int, int]:
+        """Run optimize_with_thumbnail in the shared process pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_process_pool(),
+            partial(ImageProcessor.optimize_with_thumbnail, image_path, output_path, thumbnail_path, **kwargs)
+        )
+
+    @staticmethod
+    def _open_for_storage(image_path: str, max_dimension: int) -> Image.Image:
+        img = Image.open(image_path)
+        if img.width > max_dimension or img.height > max_dimension:
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale (never below the
+            # target size) before anything loads the pixels. No-op for non-JPEG
+            img.draft('RGB', _fit_within(img.width, img.height, max_dimension))
+        _apply_exif_orientation(img)
+        return img
+
+    @staticmethod
+    def _resize_for_storage(img: Image.Image, max_dimension: int, resample: Image.Resampling) -> Image.Image:
+        # Convert to RGB if necessary (required for JPEG/WebP)
+        if img.mode not in _STORAGE_MODES:
+            img = img.convert('RGB')
+
+        # Resize if larger than max_dimension
+        if img.width > max_dimension or img.height > max_dimension:
+            new_width, new_height = _fit_within(img.width, img.height, max_dimension)
+            logger.info(f"Resizing image from {img.width}x{img.height} to {new_width}x{new_height}")
+            # reducing_gap: box-reduce by an integer factor first (fast), leaving
+            # Lanczos at least 2x headroom so quality matches a direct resize
+            return img.resize((new_width, new_height), resample, reducing_gap=2.0)
+
+        logger.info(f"Image {img.width}x{img.height} is within limits, no resize needed")
+        return img
+
+    @staticmethod
+    def _encode_storage(
+        img: Image.Image,
+        quality: int,
+        use_webp: bool,
+        subsampling: int,
+        fast: bool,
+        strip_metadata: bool = True
+    ) -> bytes:
+        """The one encoder behind every storage copy."""
+        metadata = _metadata_params(img, strip_metadata)
+        with io.BytesIO() as output:
+            if use_webp:
+                img.save(output, "WEBP", quality=quality, method=2 if fast else 4, **metadata)
+            else:
+                img.save(
+                    output, "JPEG", quality=quality, optimize=True, progressive=True,
+                    subsampling=subsampling, **metadata
+                )
+            return output.getvalue()
+
+    @staticmethod
+    def _write_storage_copy(data: bytes, image_path: str, output_path: str, use_webp: bool) -> str:
+        output_path = _storage_path(output_path, use_webp)
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        logger.info(f"Saved optimized {'WebP' if use_webp else 'JPEG'} image: {output_path}")
+
+        # Log size savings
+        _log_size_savings(image_path, output_path)
+        return output_path
+
     @staticmethod
     def create_thumbnail(
         image_path: str,
         output_path: str,
         size: Tuple[int, int] = (400, 400),
-        quality: int = 75
+        quality: int = 82,
+        progressive: bool = True,
+        subsampling: int = 2,
+        resample: Image.Resampling = _RESAMPLE,
+        use_webp: bool = False
     ) -> str:
         """
         Create a thumbnail of an image.
@@ -254,7 +789,11 @@ class ImageProcessor:
             image_path: Path to source image
             output_path: Path for thumbnail output
             size: Tuple of (width, height) for thumbnail
-            quality: JPEG quality (default 75 for thumbnails)
+            quality: JPEG/WebP quality (default 82 for thumbnails)
+            progressive: Write a progressive JPEG
+            subsampling: JPEG chroma subsampling (default 2 = 4:2:0)
+            resample: Resampling filter (default Lanczos3; BOX for HDR sources)
+            use_webp: Write WebP (extension adjusted to .webp) instead of JPEG
 
         Returns:
             Path to created thumbnail
@@ -262,23 +801,61 @@ class ImageProcessor:
         try:
             img = Image.open(image_path)
 
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-
-            # Create thumbnail preserving aspect ratio
-            img.thumbnail(size, Image.Resampling.LANCZOS)
+            # Reduced-scale JPEG decode. Must happen before convert() loads the
+            # pixels; 2x the box leaves the same headroom as thumbnail()'s
+            # default reducing_gap
+            img.draft('RGB', (size[0] * 2, size[1] * 2))
+            _apply_exif_orientation(img)
 
-            # Save thumbnail with optimization
-            img.save(output_path, "JPEG", quality=quality, optimize=True)
-
-            logger.info(f"Created thumbnail: {output_path}")
-            return output_path
+            return ImageProcessor._save_thumbnail(
+                img, output_path, size, quality, progressive, subsampling, resample, use_webp
+            )
 
         except Exception as e:
             logger.error(f"Error creating thumbnail for {image_path}: {e}")
             raise
 
+    @staticmethod
+    def _save_thumbnail(
+        img: Image.Image,
+        output_path: str,
+        size: Tuple[int, int],
+        quality: int,
+        progressive: bool = True,
+        subsampling: int = 2,
+        resample: Image.Resampling = _RESAMPLE,
+        use_webp: bool = False
+    ) -> str:
+        # Convert to RGB if necessary
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        # Create thumbnail preserving aspect ratio
+        img.thumbnail(size, resample)
+
+        # Save thumbnail with optimization
+        output_path = _storage_path(output_path, use_webp)
+        if use_webp:
+            # method=0 is the fastest WebP encoder; at thumbnail size its
+            # slightly larger output is a few hundred bytes
+            img.save(output_path, "WEBP", quality=quality, method=0)
+        else:
+            img.save(
+                output_path, "JPEG", quality=quality, optimize=True,
+                progressive=progressive, subsampling=subsampling
+            )
+
+        logger.info(f"Created thumbnail: {output_path}")
+        return output_path
+
+    @staticmethod
+    async def create_thumbnail_async(image_path: str, output_path: str, **kwargs) -> str:
+        """Run create_thumbnail in the shared process pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_process_pool(), partial(ImageProcessor.create_thumbnail, image_path, output_path, **kwargs)
+        )
+
     @staticmethod
     def get_image_dimensions(image_path: str) -> Tuple[int, int]:
         """
@@ -291,6 +868,20 @@ class ImageProcessor:
             Tuple of (width, height)
         """
         try:
+            st = os.stat(image_path)
+        except OSError as e:
+            logger.error(f"Error getting dimensions for {image_path}: {e}")
+            return (0, 0)
+        return ImageProcessor._dimensions_for_version(image_path, st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    @lru_cache(maxsize=2048)
+    def _dimensions_for_version(image_path: str, mtime_ns: int, size: int) -> Tuple[int, int]:
+        try:
+            # Common web formats: parse the header without creating a PIL image
+            dimensions = _header_size(image_path)
+            if dimensions is not None:
+                return dimensions
             with Image.open(image_path) as img:
                 return img.size
         except Exception as e:
@@ -298,19 +889,31 @@ class ImageProcessor:
             return (0, 0)
 
     @staticmethod
-    def validate_image(image_path: str) -> bool:
+    def validate_image(image_path: str, strict: bool = False) -> bool:
         """
         Validate that a file is a valid image.
 
+        By default only the file signature (magic bytes) is checked, which is
+        enough to reject non-image uploads without parsing the file. strict=True
+        additionally runs PIL's verify().
+
         Args:
             image_path: Path to image file
+            strict: Also parse the file with PIL's verify()
 
         Returns:
             True if valid image, False otherwise
         """
         try:
-            with Image.open(image_path) as img:
-                img.verify()
+            with open(image_path, 'rb') as f:
+                header = f.read(16)
+            if not _has_image_signature(header):
+                logger.error(f"Invalid image {image_path}: unrecognized file signature")
+                return False
+
+            if strict:
+                with Image.open(image_path) as img:
+                    img.verify()
             return True
         except Exception as e:
             logger.error(f"Invalid image {image_path}: {e}")
@@ -328,7 +931,7 @@ class ImageProcessor:
             File size in bytes
         """
         try:
-            return os.path.getsize(file_path)
+            return os.stat(file_path).st_size
         except Exception as e:
             logger.error(f"Error getting file size for {file_path}: {e}")
             return 0
@@ -344,25 +947,11 @@ class ImageProcessor:
         Returns:
             True if RAW format, False otherwise
         """
-        raw_extensions = [
-            '.cr2', '.cr3',  # Canon
-            '.nef', '.nrw',  # Nikon
-            '.arw', '.srf', '.sr2',  # Sony
-            '.orf',  # Olympus
-            '.rw2',  # Panasonic
-            '.dng',  # Adobe
-            '.raf',  # Fujifilm
-            '.pef',  # Pentax
-            '.x3f',  # Sigma
-            '.erf',  # Epson
-            '.mrw',  # Minolta
-        ]
-
-        ext = os.path.splitext(filename.lower())[1]
-        return ext in raw_extensions
+        # Lowercase only the extension, not the whole name
+        return os.path.splitext(filename)[1].lower() in _RAW_EXTENSIONS
 
     @staticmethod
-    def convert_raw_to_jpeg(raw_path: str, output_path: str) -> str:
+    def convert_raw_to_jpeg(raw_path: str, output_path: str, half_size: bool = True) -> str:
         """
         Convert RAW image to JPEG for processing.
         Note: Requires rawpy library for advanced RAW processing.
@@ -370,6 +959,8 @@ class ImageProcessor:
         Args:
             raw_path: Path to RAW image
             output_path: Path for JPEG output
+            half_size: Demosaic at half resolution (rawpy only). About 4x faster
+                and still larger than IMAGE_MAX_DIMENSION for most sensors
 
         Returns:
             Path to converted JPEG
@@ -380,7 +971,10 @@ class ImageProcessor:
                 import rawpy
 
                 with rawpy.imread(raw_path) as raw:
-                    rgb = raw.postprocess()
+                    # Camera white balance matches what the camera JPEG would show;
+                    # half_size skips full-resolution demosaicing, which dominates
+                    # conversion time and is thrown away by the storage resize
+                    rgb = raw.postprocess(half_size=half_size, use_camera_wb=True, output_bps=8)
                     img = Image.fromarray(rgb)
                     img.save(output_path, "JPEG", quality=95)
 
@@ -398,3 +992,11 @@ class ImageProcessor:
         except Exception as e:
             logger.error(f"Error converting RAW image {raw_path}: {e}")
             raise
+
+    @staticmethod
+    async def convert_raw_to_jpeg_async(raw_path: str, output_path: str, **kwargs) -> str:
+        """Run convert_raw_to_jpeg in the shared process pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_process_pool(), partial(ImageProcessor.convert_raw_to_jpeg, raw_path, output_path, **kwargs)
+        )
@@ -0,0 +1,8 @@
+import os
+
+# Settings requires these at import time; tests never talk to the services
+for _name in (
+    "OPENAI_API_KEY", "GEMINI_API_KEY", "SUPABASE_URL", "SUPABASE_ANON_KEY",
+    "SUPABASE_SERVICE_KEY", "DATABASE_URL", "SECRET_KEY"
+):
+    os.environ.setdefault(_name, "test")
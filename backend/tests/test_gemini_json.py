@@ -0,0 +1,158 @@
+import asyncio
+
+import orjson
+import pytest
+
+from app.models.image import ImageFactorScores
+from app.services.gemini_vision import GeminiVisionService, _close_truncated_json, _read_json_stream
+
+
+class _Chunk:
+    def __init__(self, text=None):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("chunk has no text")
+        return self._text
+
+
+class _Stream:
+    """Async iterator over canned chunks that records whether it was closed."""
+
+    def __init__(self, texts):
+        self._chunks = iter([_Chunk(text) for text in texts])
+        self.consumed = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+        self.consumed += 1
+        return chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+class TestCloseTruncatedJson:
+    def test_truncated_inside_string(self):
+        text = '{"overall_score": 80, "ai_summary": "Sharp, well exp'
+        assert orjson.loads(_close_truncated_json(text)) == {"overall_score": 80}
+
+    def test_truncated_inside_nested_array_and_object(self):
+        text = '{"a": 1, "b": [{"x": 1, "y": 2}, {"x": 3, "y": [4, 5'
+        assert orjson.loads(_close_truncated_json(text)) == {"a": 1, "b": [{"x": 1, "y": 2}, {"x": 3, "y": [4]}]}
+
+    def test_truncated_after_dangling_comma(self):
+        text = '{"a": 1, "b": [1, 2,'
+        assert orjson.loads(_close_truncated_json(text)) == {"a": 1, "b": [1, 2]}
+
+    def test_truncated_after_dangling_key(self):
+        text = '{"a": 1, "b":'
+        assert orjson.loads(_close_truncated_json(text)) == {"a": 1}
+
+    def test_escaped_quote_does_not_end_string(self):
+        text = '{"a": 1, "b": "say \\"hi\\", then'
+        assert orjson.loads(_close_truncated_json(text)) == {"a": 1}
+
+    @pytest.mark.parametrize("text", [
+        "",
+        '{"a": "no cut point, the comma is inside a string',
+        '{"a": [1',
+    ])
+    def test_unrecoverable_returns_none(self, text):
+        assert _close_truncated_json(text) is None
+
+    def test_complete_document_drops_trailing_data(self):
+        assert _close_truncated_json('{"a": {"b": 1}} trailing') == '{"a": {"b": 1}}'
+
+    def test_top_level_only_drops_partial_member(self):
+        text = '{"a": 1, "b": [{"x": 1}, {"x": 2'
+        assert orjson.loads(_close_truncated_json(text, top_level_only=True)) == {"a": 1}
+
+
+class TestReadJsonStream:
+    def test_object_split_across_chunks(self):
+        stream = _Stream(['{"a": "}{', '", "b": {"c": ', "1}}"])
+        text, last_chunk = asyncio.run(_read_json_stream(stream))
+        assert orjson.loads(text) == {"a": "}{", "b": {"c": 1}}
+        assert last_chunk.text == "1}}"
+
+    def test_trailing_data_after_object_is_dropped_and_stream_drained(self):
+        stream = _Stream(['{"a": 1', '}\n```', " more text", None])
+        text, last_chunk = asyncio.run(_read_json_stream(stream))
+        assert text == '{"a": 1}'
+        # Remaining chunks are still consumed for the final usage metadata
+        assert stream.consumed == 4
+        with pytest.raises(ValueError):
+            last_chunk.text
+        assert stream.closed
+
+    def test_incomplete_stream_returns_none(self):
+        stream = _Stream(['{"a": 1, ', '"b": [2'])
+        text, last_chunk = asyncio.run(_read_json_stream(stream))
+        assert text is None
+        assert last_chunk.text == '"b": [2'
+        assert stream.closed
+
+    def test_chunks_without_text_are_skipped(self):
+        stream = _Stream([None, '{"a": 1}'])
+        text, _ = asyncio.run(_read_json_stream(stream))
+        assert text == '{"a": 1}'
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+_BASE_ANALYSIS = {
+    "overall_score": 80,
+    "quality_tier": "good",
+    "factor_scores": {name: 80 for name in ImageFactorScores.model_fields},
+    "ai_summary": "Sharp and well exposed.",
+    "subject_analysis": {
+        "faces_detected": 1, "eyes_status": "all_open", "primary_subject": "player", "has_people": True
+    },
+}
+_JERSEYS = {
+    "is_group_photo": False,
+    "detected_jersey_numbers": [{"number": "7", "confidence": 0.95}, {"number": "9", "confidence": 0.97}],
+    "primary_jersey_number": "7",
+    "jersey_confidence": 0.95,
+    "player_names": []
+}
+
+
+class TestSalvageTruncated:
+    def _truncated(self, document, cut):
+        text = orjson.dumps(document).decode()
+        return _Response(text[:text.index(cut)])
+
+    def test_base_response_is_salvaged(self):
+        response = self._truncated({**_BASE_ANALYSIS, "recommendations": ["x"]}, '"x"')
+        result = GeminiVisionService()._salvage_truncated(response)
+        assert result.overall_score == 80
+
+    def test_team_mode_rejects_missing_jersey_detection(self):
+        response = self._truncated({**_BASE_ANALYSIS, "jersey_detection": _JERSEYS}, '"jersey_detection"')
+        assert GeminiVisionService()._salvage_truncated(response, team_mode=True) is None
+
+    def test_team_mode_rejects_partial_jersey_detection(self):
+        response = self._truncated({**_BASE_ANALYSIS, "jersey_detection": _JERSEYS}, '{"number":"9"')
+        assert GeminiVisionService()._salvage_truncated(response, team_mode=True) is None
+
+    def test_team_mode_accepts_complete_jersey_detection(self):
+        response = self._truncated(
+            {**_BASE_ANALYSIS, "jersey_detection": _JERSEYS, "recommendations": ["x"]}, '"x"'
+        )
+        result = GeminiVisionService()._salvage_truncated(response, team_mode=True)
+        assert [jersey["number"] for jersey in result.detected_jersey_numbers] == ["7", "9"]
+        assert result.jersey_number == "7"
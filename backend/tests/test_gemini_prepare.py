@@ -0,0 +1,51 @@
+import io
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from app.services.gemini_vision import _decode_and_prepare, _load_resized_logo
+
+
+def _jpeg(tmp_path, size):
+    path = tmp_path / "image.jpg"
+    Image.new("RGB", size, (90, 120, 150)).save(path, "JPEG")
+    return str(path)
+
+
+@pytest.fixture
+def thumbnail_input_sizes(monkeypatch):
+    """Record the decoded size each thumbnail() call starts from."""
+    sizes = []
+    thumbnail = Image.Image.thumbnail
+
+    def spy(self, *args, **kwargs):
+        sizes.append(self.size)
+        return thumbnail(self, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, "thumbnail", spy)
+    return sizes
+
+
+class TestDecodeAndPrepare:
+    def test_landscape_jpeg_decodes_at_reduced_scale(self, tmp_path, thumbnail_input_sizes):
+        data = _decode_and_prepare(_jpeg(tmp_path, (6000, 4000)))
+        # The fitted 2048x1365 target allows a 1/2-scale DCT decode
+        assert thumbnail_input_sizes == [(3000, 2000)]
+        with Image.open(io.BytesIO(data)) as img:
+            assert img.size == (2048, 1365)
+
+    def test_small_image_is_not_resized(self, tmp_path, thumbnail_input_sizes):
+        data = _decode_and_prepare(_jpeg(tmp_path, (800, 600)))
+        assert thumbnail_input_sizes == []
+        with Image.open(io.BytesIO(data)) as img:
+            assert img.size == (800, 600)
+
+
+class TestLoadResizedLogo:
+    def test_large_logo_is_fitted(self, tmp_path):
+        path = _jpeg(tmp_path, (2400, 1200))
+        data = _load_resized_logo(path, 0)
+        with Image.open(io.BytesIO(data)) as img:
+            assert img.format == "PNG"
+            assert img.size == (512, 256)
@@ -0,0 +1,83 @@
+import asyncio
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+ImageEnhance = pytest.importorskip("PIL.ImageEnhance")
+
+from app.models.image import PostProcessingRecommendations
+from app.services.image_enhancement import ImageEnhancementService
+
+
+def _enhance_chain(img, exposure, contrast, saturation, vibrance):
+    """The ImageEnhance chain that _apply_tonal_adjustments fuses."""
+    img = ImageEnhance.Brightness(img).enhance(2 ** exposure)
+    img = ImageEnhance.Contrast(img).enhance(1.0 + contrast / 100.0)
+    img = ImageEnhance.Color(img).enhance(1.0 + saturation / 100.0)
+    return ImageEnhance.Color(img).enhance(1.0 + vibrance / 200.0)
+
+
+@pytest.mark.parametrize("exposure,contrast,saturation,vibrance", [
+    (0.3, 0, 0, 0),
+    (0, 20, 0, 0),
+    (0, 0, 15, 10),
+    (0.2, 15, 10, 10),
+    (-0.5, -20, -30, 0),
+])
+def test_tonal_adjustments_approximate_enhance_chain(exposure, contrast, saturation, vibrance):
+    # Mid-tone input with little per-pixel colour spread, so no stage of the
+    # chain saturates and the only differences are per-stage rounding
+    rng = np.random.default_rng(0)
+    base = rng.integers(100, 140, size=(64, 64, 1))
+    pixels = np.clip(base + rng.integers(-8, 9, size=(64, 64, 3)), 0, 255).astype(np.uint8)
+    img = Image.fromarray(pixels)
+
+    recommendations = PostProcessingRecommendations(
+        exposure_adjustment=exposure,
+        contrast_adjustment=contrast,
+        saturation_adjustment=saturation,
+        vibrance_adjustment=vibrance,
+        can_auto_fix=True
+    )
+    fused = ImageEnhancementService()._apply_tonal_adjustments(img, recommendations)
+    chained = _enhance_chain(img, exposure, contrast, saturation, vibrance)
+
+    diff = np.abs(np.asarray(fused, dtype=np.int16) - np.asarray(chained, dtype=np.int16))
+    # Up to four roundings (one per stage) accumulate in the chain
+    assert diff.max() <= 4
+
+
+def test_repeated_previews_through_the_pool_share_one_decode(tmp_path, monkeypatch):
+    from app.services import image_enhancement
+
+    path = tmp_path / "photo.jpg"
+    Image.new("RGB", (2400, 1600), (90, 120, 150)).save(path, "JPEG")
+
+    decodes = []
+    decode_rgb = image_enhancement._decode_rgb
+
+    def counting_decode(*args):
+        decodes.append(args)
+        return decode_rgb(*args)
+
+    monkeypatch.setattr(image_enhancement, "_decode_rgb", counting_decode)
+    image_enhancement._decoded_preview.cache_clear()
+
+    async def previews():
+        service = ImageEnhancementService()
+        return [
+            await service.create_preview_async(
+                str(path), PostProcessingRecommendations(contrast_adjustment=contrast, can_auto_fix=True)
+            )
+            for contrast in (10, 20, 30)
+        ]
+
+    results = asyncio.run(previews())
+
+    assert decodes == [(str(path), 1200)]
+    assert image_enhancement._decoded_preview.cache_info().hits == 2
+    for data in results:
+        with Image.open(io.BytesIO(data)) as img:
+            assert img.size == (1200, 800)
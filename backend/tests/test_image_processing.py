@@ -0,0 +1,194 @@
+import struct
+from datetime import datetime
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+from PIL.TiffImagePlugin import IFDRational
+
+from app.utils.image_processing import ImageProcessor, _has_image_signature, _header_size, _scan_header
+
+
+def _exif():
+    exif = Image.Exif()
+    exif[0x010F] = "Canon"  # Make
+    exif[0x0110] = "EOS R5"  # Model
+    exif[0x0131] = "Firmware 1.8.1"  # Software
+    exif[0x013B] = "Jane Doe"  # Artist
+    exif[0x0132] = "2024:05:01 10:11:12"  # DateTime
+    sub = exif.get_ifd(0x8769)  # Exif sub-IFD
+    sub[0x829A] = IFDRational(1, 250)  # ExposureTime
+    sub[0x829D] = IFDRational(28, 10)  # FNumber
+    sub[0x920A] = IFDRational(50, 1)  # FocalLength
+    sub[0x8827] = 400  # ISOSpeedRatings
+    sub[0xA434] = "RF50mm F1.8 STM"  # LensModel
+    sub[0xA420] = "0123456789abcdef"  # ImageUniqueID
+    gps = exif.get_ifd(0x8825)
+    gps[1] = "N"
+    gps[2] = (IFDRational(37, 1), IFDRational(46, 1), IFDRational(0, 1))
+    return exif
+
+
+class TestExtractExifData:
+    def test_full_tag_dict_with_typed_fields(self, tmp_path):
+        path = tmp_path / "exif.jpg"
+        Image.new("RGB", (64, 48), "gray").save(path, exif=_exif())
+
+        data = ImageProcessor.extract_exif_data(str(path))
+
+        assert (data["width"], data["height"], data["format"]) == (64, 48, "JPEG")
+        # Tags nothing downstream reads are still stored
+        assert data["Software"] == "Firmware 1.8.1"
+        assert data["Artist"] == "Jane Doe"
+        assert data["ImageUniqueID"] == "0123456789abcdef"
+        assert "GPSInfo" in data
+        # Formatted strings and typed fields from the raw values
+        assert data["ExposureTime"] == "1/250"
+        assert data["shutter_speed"] == "1/250"
+        assert data["camera_make"] == "Canon"
+        assert data["lens_model"] == "RF50mm F1.8 STM"
+        assert data["aperture"] == pytest.approx(2.8)
+        assert data["focal_length"] == pytest.approx(50.0)
+        assert data["iso"] == 400
+        assert data["capture_time"] == datetime(2024, 5, 1, 10, 11, 12)
+
+    def test_image_without_exif(self, tmp_path):
+        path = tmp_path / "plain.png"
+        Image.new("RGB", (10, 20)).save(path)
+
+        data = ImageProcessor.extract_exif_data(str(path))
+
+        assert data == {"width": 10, "height": 20, "format": "PNG", "mode": "RGB"}
+
+
+class TestHasImageSignature:
+    @pytest.mark.parametrize("brand", [b"heic", b"heix", b"mif1", b"crx "])
+    def test_accepts_image_ftyp_brands(self, brand):
+        assert _has_image_signature(b"\x00\x00\x00\x18ftyp" + brand + b"\x00\x00\x00\x00")
+
+    @pytest.mark.parametrize("brand", [b"isom", b"mp42", b"qt  ", b"3gp4"])
+    def test_rejects_video_ftyp_brands(self, brand):
+        assert not _has_image_signature(b"\x00\x00\x00\x18ftyp" + brand + b"\x00\x00\x00\x00")
+
+    def test_rejects_unknown_data(self):
+        assert not _has_image_signature(b"%PDF-1.7\n")
+
+
+def _save(tmp_path, name, img, **params):
+    path = tmp_path / name
+    img.save(path, **params)
+    return str(path)
+
+
+def _pil_header(path):
+    with Image.open(path) as img:
+        return img.format, img.mode, img.width, img.height
+
+
+class TestHeaderParsers:
+    @pytest.mark.parametrize("mode", ["RGB", "L", "CMYK"])
+    @pytest.mark.parametrize("progressive", [False, True])
+    def test_jpeg_matches_pil(self, tmp_path, mode, progressive):
+        path = _save(tmp_path, "img.jpg", Image.new(mode, (37, 23)), progressive=progressive)
+
+        header = _scan_header(path)
+
+        assert header[:4] == _pil_header(path)
+        assert header[4] is None
+        assert _header_size(path) == (37, 23)
+
+    def test_jpeg_exif_payload(self, tmp_path):
+        path = _save(tmp_path, "exif.jpg", Image.new("RGB", (8, 8)), exif=_exif())
+
+        raw_exif = _scan_header(path)[4]
+
+        with Image.open(path) as img:
+            assert raw_exif == img.info["exif"]
+
+    def test_mpo_is_left_to_pil(self, tmp_path):
+        frames = [Image.new("RGB", (40, 30), "red"), Image.new("RGB", (40, 30), "blue")]
+        path = _save(tmp_path, "stereo.mpo", frames[0], format="MPO", save_all=True, append_images=frames[1:])
+
+        assert _scan_header(path) is None
+        assert _header_size(path) == (40, 30)
+        assert ImageProcessor.extract_exif_data(path)["format"] == "MPO"
+
+    def test_app2_segments_after_mpf_are_skipped_whole(self, tmp_path):
+        path = _save(tmp_path, "img.jpg", Image.new("RGB", (37, 23)))
+        with open(path, "rb") as f:
+            data = f.read()
+
+        def app2(payload):
+            return b"\xff\xe2" + struct.pack(">H", len(payload) + 2) + payload
+
+        # An MPF segment followed by two more APP2 segments (e.g. ICC chunks)
+        segments = app2(b"MPF\x00" + b"\x00" * 8) + app2(b"ICC_PROFILE\x00" + b"\x00" * 16) * 2
+        with open(path, "wb") as f:
+            f.write(data[:2] + segments + data[2:])
+
+        assert _scan_header(path) is None  # MPF: left to PIL
+        assert _header_size(path) == (37, 23)
+        assert ImageProcessor.get_image_dimensions(path) == (37, 23)
+
+    @pytest.mark.parametrize("mode", ["RGB", "RGBA", "P", "L", "LA", "1", "I;16"])
+    def test_png_matches_pil(self, tmp_path, mode):
+        path = _save(tmp_path, "img.png", Image.new(mode, (37, 23)))
+
+        assert _scan_header(path)[:4] == _pil_header(path)
+        assert _header_size(path) == (37, 23)
+
+    def test_png_exif_chunk(self, tmp_path):
+        path = _save(tmp_path, "exif.png", Image.new("RGB", (8, 8)), exif=_exif())
+
+        raw_exif = _scan_header(path)[4]
+
+        assert raw_exif is not None
+        assert ImageProcessor.extract_exif_data(path)["Make"] == "Canon"
+
+    @pytest.mark.parametrize("name,params,chunk", [
+        ("lossy", {"lossless": False}, b"VP8 "),
+        ("lossless", {"lossless": True}, b"VP8L"),
+        ("extended", {"lossless": False, "exif": b"Exif\x00\x00MM\x00*\x00\x00\x00\x08\x00\x00"}, b"VP8X"),
+    ])
+    def test_webp_size(self, tmp_path, name, params, chunk):
+        path = _save(tmp_path, f"{name}.webp", Image.new("RGB", (37, 23), "green"), **params)
+        with open(path, "rb") as f:
+            assert f.read(16)[12:16] == chunk
+
+        assert _header_size(path) == (37, 23)
+
+    def test_gif_size(self, tmp_path):
+        path = _save(tmp_path, "img.gif", Image.new("P", (37, 23)))
+
+        assert _header_size(path) == (37, 23)
+
+    @pytest.mark.parametrize("name,length", [
+        ("img.jpg", 20),
+        ("img.png", 20),
+        ("img.webp", 20),
+        ("img.gif", 8),
+    ])
+    def test_truncated_headers(self, tmp_path, name, length):
+        path = _save(tmp_path, name, Image.new("RGB", (37, 23)))
+        with open(path, "rb") as f:
+            data = f.read(length)
+        with open(path, "wb") as f:
+            f.write(data)
+
+        assert _scan_header(path) is None
+        assert _header_size(path) is None
+
+    def test_falls_back_to_pil_when_scan_fails(self, tmp_path):
+        # PIL skips stray bytes between JPEG markers; the header scanner doesn't
+        path = _save(tmp_path, "img.jpg", Image.new("RGB", (37, 23)))
+        with open(path, "rb") as f:
+            data = f.read()
+        app0_end = 4 + struct.unpack(">H", data[4:6])[0]
+        with open(path, "wb") as f:
+            f.write(data[:app0_end] + b"\x00" + data[app0_end:])
+
+        assert _scan_header(path) is None
+        assert _header_size(path) is None
+        data = ImageProcessor.extract_exif_data(path)
+        assert (data["format"], data["width"], data["height"]) == ("JPEG", 37, 23)
+        assert ImageProcessor.get_image_dimensions(path) == (37, 23)
@@ -12,6 +12,9 @@ import sys
 # Load environment variables
 load_dotenv()
 
+class MigrationError(Exception):
+    """Raised to roll back the migration transaction when a file fails"""
+
 def run_migration(cursor, filepath):
     """Execute a SQL migration file"""
     print(f"\n{'='*60}")
@@ -41,37 +44,40 @@ def main():
     print(f"Connecting to database...")
 
     try:
-        # Connect to database
+        # One connection for the migrations and the verification query
         conn = psycopg2.connect(database_url)
-        conn.autocommit = False  # Use transactions
-        cursor = conn.cursor()
-
-        print("✓ Connected successfully\n")
-
-        # List of migration files to run in order
-        migrations = [
-            'database/schema.sql',
-            'database/migration_001_team_player_support.sql'
-        ]
-
-        success_count = 0
-
-        for migration_file in migrations:
-            if os.path.exists(migration_file):
-                if run_migration(cursor, migration_file):
-                    success_count += 1
-                    conn.commit()
-                    print(f"✓ Transaction committed\n")
-                else:
-                    conn.rollback()
-                    print(f"✗ Transaction rolled back\n")
-                    print(f"\nMigrations stopped due to error in {migration_file}")
-                    break
-            else:
-                print(f"✗ Migration file not found: {migration_file}\n")
-
-        cursor.close()
-        conn.close()
+    except psycopg2.Error as e:
+        print(f"\n✗ Database connection error: {e}")
+        return 1
+
+    print("✓ Connected successfully\n")
+
+    # List of migration files to run in order
+    migrations = [
+        'database/schema.sql',
+        'database/migration_001_team_player_support.sql'
+    ]
+
+    success_count = 0
+
+    try:
+        # All migrations share one transaction: committed together at the end
+        # of the block, or rolled back together if any of them fails
+        try:
+            with conn:
+                with conn.cursor() as cursor:
+                    for migration_file in migrations:
+                        if not os.path.exists(migration_file):
+                            print(f"✗ Migration file not found: {migration_file}\n")
+                            continue
+                        if not run_migration(cursor, migration_file):
+                            raise MigrationError(migration_file)
+                        success_count += 1
+            print(f"✓ Transaction committed\n")
+        except MigrationError as e:
+            success_count = 0
+            print(f"✗ Transaction rolled back\n")
+            print(f"\nMigrations stopped due to error in {e}")
 
         print(f"\n{'='*60}")
         print(f"Migration Summary")
@@ -85,17 +91,14 @@ def main():
             print("✓ All migrations completed successfully!")
 
             # Verify tables were created
-            conn = psycopg2.connect(database_url)
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT table_name
-                FROM information_schema.tables
-                WHERE table_schema = 'public'
-                ORDER BY table_name
-            """)
-            tables = cursor.fetchall()
-            cursor.close()
-            conn.close()
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT table_name
+                    FROM information_schema.tables
+                    WHERE table_schema = 'public'
+                    ORDER BY table_name
+                """)
+                tables = cursor.fetchall()
 
             print(f"\nCreated tables ({len(tables)}):")
             for table in tables:
@@ -107,11 +110,13 @@ def main():
             return 1
 
     except psycopg2.Error as e:
-        print(f"\n✗ Database connection error: {e}")
+        print(f"\n✗ Database error: {e}")
         return 1
     except Exception as e:
         print(f"\n✗ Unexpected error: {e}")
         return 1
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
     sys.exit(main())